@@ -0,0 +1,107 @@
+// Streams the selected ZIP to the server in chunks (see receive_upload_chunk in
+// dash_app.py) instead of passing it through Dash as one base64 string.
+// Once the whole file is on the server, the "upload-ready" store is set to
+// {job_id, filename}, which lets the "Process ZIP" button start the job.
+(function () {
+    // bytes per request; the server writes every chunk to disk in smaller blocks
+    const CHUNK_SIZE = 8 * 1024 * 1024;
+    // attempts per chunk before the upload is given up
+    const MAX_RETRIES = 3;
+
+    function setInfo(text) {
+        dash_clientside.set_props("browse-info", {children: text});
+    }
+
+    async function uploadedSize(jobId) {
+        const response = await fetch(`/jobs/${jobId}/upload`);
+        return (await response.json()).size;
+    }
+
+    function uploadDisabled() {
+        const dropZone = document.getElementById("upload-zip");
+        return !dropZone || dropZone.disabled;
+    }
+
+    async function uploadFile(file) {
+        if (!file || uploadDisabled()) {
+            return;
+        }
+        if (!file.name.toLowerCase().endsWith(".zip")) {
+            setInfo("Please select a ZIP file");
+            return;
+        }
+        dash_clientside.set_props("upload-ready", {data: null});
+
+        try {
+            const job = await (await fetch("/jobs", {method: "POST"})).json();
+            if (job.max_bytes && file.size > job.max_bytes) {
+                setInfo(`${file.name} exceeds the upload limit of ${Math.round(job.max_bytes / 1024 ** 2)} MB`);
+                return;
+            }
+            let offset = 0;
+            let retries = 0;
+            while (offset < file.size) {
+                const chunk = file.slice(offset, offset + CHUNK_SIZE);
+                let response;
+                try {
+                    response = await fetch(`/jobs/${job.job_id}/upload?offset=${offset}`, {
+                        method: "PUT",
+                        headers: {"Content-Type": "application/octet-stream"},
+                        body: chunk
+                    });
+                    if (response.status >= 500) {
+                        throw new Error(`server error ${response.status}`);
+                    }
+                } catch (error) {
+                    // connection or server error: resume from what the server has received
+                    if (++retries > MAX_RETRIES) {
+                        throw error;
+                    }
+                    offset = await uploadedSize(job.job_id);
+                    continue;
+                }
+                const result = await response.json();
+                if (response.status === 409) {
+                    // offset mismatch: resume from the bytes the server reports
+                    if (++retries > MAX_RETRIES) {
+                        throw new Error(result.error);
+                    }
+                    offset = result.size;
+                } else if (!response.ok) {
+                    // upload too large (413) or rejected (400): retrying cannot succeed
+                    throw new Error(result.error);
+                } else {
+                    offset = result.size;
+                    retries = 0;
+                }
+                setInfo(`Uploading ${file.name}: ${Math.round(100 * offset / file.size)}%`);
+            }
+            dash_clientside.set_props("upload-ready", {data: {job_id: job.job_id, filename: file.name}});
+        } catch (error) {
+            setInfo(`Upload of ${file.name} failed: ${error.message}`);
+        }
+    }
+
+    document.addEventListener("click", function (event) {
+        if (event.target.closest("#upload-zip") && !uploadDisabled()) {
+            const input = document.createElement("input");
+            input.type = "file";
+            input.accept = ".zip";
+            input.addEventListener("change", () => uploadFile(input.files[0]));
+            input.click();
+        }
+    });
+
+    document.addEventListener("dragover", function (event) {
+        if (event.target.closest("#upload-zip")) {
+            event.preventDefault();
+        }
+    });
+
+    document.addEventListener("drop", function (event) {
+        if (event.target.closest("#upload-zip")) {
+            event.preventDefault();
+            uploadFile(event.dataTransfer.files[0]);
+        }
+    });
+})();
@@ -1,12 +1,13 @@
 from core.common import *
 from app.geoprocessing import *
+from app.results import *
+from app.network_layer import *
+from app.jobs import *
 from app.utils import *
-import json
-import base64
-import threading
 import datetime
 import psutil
-from dash import no_update, Dash, html, dcc, Output, Input, State, dash_table
+import flask
+from dash import no_update, ctx, Dash, html, dcc, Output, Input, State, dash_table
 import dash_bootstrap_components as dbc
 import dash_leaflet as dl
 from dash.exceptions import PreventUpdate
@@ -29,17 +30,80 @@ date_picker_max_date = datetime.date.today()
 os.makedirs(STATIC_FOLDER, exist_ok=True)
 
 # Load bike network GeoDataFrames (for processing)
-bike_network_seg = gpd.read_parquet(multiline_parquet_proj)
-bike_network_node = gpd.read_parquet(point_parquet_proj)
+# (the simplified geometries of the map levels are kept apart from the matching network)
+# (the geometry hashes are only used by the incremental network refresh)
+bike_network_seg, map_level_geoms = load_map_levels(
+    gpd.read_parquet(multiline_parquet_proj).drop(columns=geometry_hash_column, errors="ignore")
+)
+bike_network_node = gpd.read_parquet(point_parquet_proj).drop(columns=geometry_hash_column, errors="ignore")
+# Build the spatial index of the network once; every upload queries the same tree
+build_network_index(bike_network_seg)
+# Fingerprint of the network rows for the result cache keys (see `network_fingerprint`)
+bike_network_id = network_fingerprint(bike_network_seg)
+if match_engine == "distance":
+    network_sample_points(bike_network_seg)
 
-# Load simplified bike network GeoJSON lines (for mapping)
-with open(multiline_geojson , "r") as f:
-   geojson_network = json.load(f)
+# Write the network map layer per zoom level once (for mapping, served by `serve_network_layer`)
+build_network_layers(bike_network_seg, map_level_geoms)
 
 # nice ones: ZEPHYR, SANDSTONE
 app = Dash(__name__, external_stylesheets=[dbc.themes.ZEPHYR])
 server = app.server
 
+def network_layer_url(level):
+    """Return the URL of a network layer level (versioned, so browsers can cache it)."""
+    return f"/network/{level}.fgb?v={get_data_version()}"
+
+@server.route("/network/<int:level>.fgb")
+def serve_network_layer(level):
+    """Serve a network layer level as FlatGeobuf (see app/network_layer.py)."""
+    if not 0 <= level < len(MAP_LEVELS):
+        flask.abort(404)
+    return flask.send_file(
+        os.path.abspath(network_layer_path(level)),
+        mimetype="application/octet-stream",
+        max_age=86400
+    )
+
+@server.route("/jobs", methods=["POST"])
+def create_upload_job():
+    """Create a job for a new upload and return its id and the upload size limit (called by assets/upload.js)."""
+    return {"job_id": create_job(), "max_bytes": upload_max_bytes()}
+
+@server.route("/jobs/<job_id>/upload", methods=["GET", "PUT"])
+def receive_upload_chunk(job_id):
+    """Append a chunk of the upload (PUT) or report the bytes received so far (GET).
+
+    The chunk is streamed to disk from the request body; `offset` (query
+    parameter) must equal the bytes received so far, so an interrupted upload
+    resumes from the size returned by GET. Only an offset mismatch (409, with
+    the bytes received) can be resumed; an upload over the size limit gets 413
+    and other errors 400.
+    """
+    try:
+        if flask.request.method == "GET":
+            return {"size": upload_size(job_id)}
+        offset = int(flask.request.args.get("offset", 0))
+        size = append_upload(job_id, flask.request.stream, offset, flask.request.content_length)
+        return {"size": size}
+    except UploadOffsetError as e:
+        return {"error": str(e), "size": upload_size(job_id)}, 409
+    except UploadTooLargeError as e:
+        return {"error": str(e)}, 413
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+@server.route("/jobs/<job_id>/matched_results.zip")
+def serve_job_results(job_id):
+    """Serve the result ZIP of a processing job (see app/jobs.py)."""
+    try:
+        zip_path = os.path.join(job_folder(job_id), "matched_results.zip")
+    except ValueError:
+        flask.abort(404)
+    if not os.path.exists(zip_path):
+        flask.abort(404)
+    return flask.send_file(os.path.abspath(zip_path), as_attachment=True)
+
 # Check memory usage before processing
 process = psutil.Process(os.getpid())
 print(f"Memory usage after initializing application: {process.memory_info().rss / 1024**2:.2f} MB")
@@ -62,16 +126,16 @@ app.layout = dbc.Container(
             # Left panel
             dbc.Col(
                 [
-                    dcc.Upload(
+                    # drop zone / file browser; the file is streamed to the server in
+                    # chunks by assets/upload.js (see `receive_upload_chunk`)
+                    html.Button(
                         id="upload-zip",
                         children=html.Div(["Drag & Drop or ", html.A("Browse for ZIP")]),
-                        accept=".zip",
-                        multiple=False,
                         style={
                             "width": "100%", "height": "60px", "lineHeight": "60px",
                             "borderWidth": "1px", "borderStyle": "dashed",
                             "borderRadius": "5px", "textAlign": "center",
-                            "margin-bottom": "10px"
+                            "margin-bottom": "10px", "background": "none"
                         },
                     ),
                     html.Div(id="browse-info"),
@@ -104,12 +168,17 @@ app.layout = dbc.Container(
                     # hidden polling interval
                     dcc.Interval(id="progress-poller", interval=2000, disabled=True),
                     # stores for some of the callback outputs
+                    # (the job of the uploaded file, and the job being processed)
                     dcc.Store(id="upload-ready"),
                     dcc.Store(id="processing-started"),
-                    # store matched segments and nodes
+                    # fingerprint of the last progress shown (see `progress_version`)
+                    dcc.Store(id="progress-version"),
+                    # store the id of the matched segments and nodes (kept server-side, see app/results.py)
                     dcc.Store(id="geojson-store-full", data={}),
                     # store filtered & aggregated matched segments and nodes
-                    dcc.Store(id="geojson-store-filtered", data={})
+                    dcc.Store(id="geojson-store-filtered", data={}),
+                    # map level of the current zoom (see `update_map_level`)
+                    dcc.Store(id="map-level", data=map_level(initial_zoom))
                 ],
                 width=3
             ),
@@ -218,9 +287,10 @@ app.layout = dbc.Container(
                                 url="https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png",
                                 attribution='&copy; OSM &copy; <a href="https://carto.com/">CARTO</a>'
                             ),
-                            # Preloaded network layer (initially hidden)
+                            # Preloaded network layer (initially hidden), fetched per zoom level
                             dl.GeoJSON(
-                                data=geojson_network,
+                                url=network_layer_url(map_level(initial_zoom)),
+                                format="flatgeobuf",
                                 id='geojson-network',
                                 options=dict(style=dict(color=color_network, weight=1, opacity=0))
                             ),
@@ -312,87 +382,54 @@ app.layout = dbc.Container(
 )
 
 # ---------- Callbacks ----------
-# initialize module-level background processing thread before callback runs
-processing_thread = None
-
-@app.callback(
-    Output("upload-ready", "data"),
-    Input("upload-zip", "contents"),
-    State("upload-zip", "filename"),
-)
-def save_uploaded_file(contents, filename):
-    if not contents or not filename:
-        # no file available yet
-        return False
-
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-    # decode base64 and save to disk
-    _, content_string = contents.split(",")
-    decoded = base64.b64decode(content_string)
-    saved_path = os.path.join(UPLOAD_FOLDER, filename)
-    with open(saved_path, "wb") as f:
-        f.write(decoded)
-
-    # signal that the file was fully saved
-    return True
+def process_job(progress, job_id, filename):
+    """Process the uploaded ZIP of a job and write its results (runs on the job pool, see app/jobs.py)."""
+    folder = job_folder(job_id)
+    zip_file_path = job_upload_path(job_id)
+    progress["current-task"] = f"Preparing to process {filename}"
+    all_segments, all_nodes = process_gpx_zip(zip_file_path, bike_network_seg, bike_network_node, progress, bike_network_id)
+
+    all_segments = all_segments.to_crs(epsg=4326) if not all_segments.empty else gpd.GeoDataFrame()
+    all_nodes = all_nodes.to_crs(epsg=4326) if not all_nodes.empty else gpd.GeoDataFrame()
+
+    segments_file_path = os.path.join(folder, "all_matched_segments_wgs84.geojson")
+    nodes_file_path = os.path.join(folder, "all_matched_nodes_wgs84.geojson")
+    # the network rows are internal (see `with_map_level`) and left out of the download
+    all_segments.drop(columns="segment_position", errors="ignore").to_file(segments_file_path, driver="GeoJSON")
+    all_nodes.to_file(nodes_file_path, driver="GeoJSON")
+
+    zip_name = create_result_zip(segments_file_path, nodes_file_path, folder)
+    result_id = save_results(all_segments, all_nodes)
+
+    # Only update store when processing is done
+    progress["store_data"] = {
+        "result_id": result_id,
+        # served by `serve_job_results`
+        "download_href": f"/jobs/{job_id}/{zip_name}"
+    }
+    progress["pct"] = 100
+    progress["current-task"] = f"Finished processing {filename}"
 
 @app.callback(
     Output("processing-started", "data"),
     Input("btn-process", "n_clicks"),
-    State("upload-zip", "filename"),
     State("upload-ready", "data"),
     prevent_initial_call=True
 )
-def start_processing(_, filename, upload_ready):
+def start_processing(_, upload):
     # guard clause: proceed only if the file has been fully saved to disk
-    if not filename or not upload_ready:
+    if not upload:
         raise PreventUpdate
 
-    # initialize progress data
-    progress_state["pct"] = 0
-    progress_state["btn-disabled"] = True
-    progress_state["current-task"] = f"Preparing to process {filename}"
-    progress_state["previous-task"] = ""
-    progress_state["show-dots"] = True
-    progress_state["dot-count"] = 0
-
-    zip_file_path = os.path.join(UPLOAD_FOLDER, filename)
-
-    def worker():
-        progress_state["running"] = True
-        all_segments, all_nodes = process_gpx_zip(zip_file_path, bike_network_seg, bike_network_node)
-
-        all_segments = all_segments.to_crs(epsg=4326) if not all_segments.empty else gpd.GeoDataFrame()
-        all_nodes = all_nodes.to_crs(epsg=4326) if not all_nodes.empty else gpd.GeoDataFrame()
-
-        segments_file_path = os.path.join(STATIC_FOLDER, "all_matched_segments_wgs84.geojson")
-        nodes_file_path = os.path.join(STATIC_FOLDER, "all_matched_nodes_wgs84.geojson")
-        all_segments.to_file(segments_file_path, driver="GeoJSON")
-        all_nodes.to_file(nodes_file_path, driver="GeoJSON")
-
-        zip_name = create_result_zip(segments_file_path, nodes_file_path)
-
-        # Only update store when processing is done
-        progress_state["store_data"] = {
-            "segments": all_segments.__geo_interface__,
-            "nodes": all_nodes.__geo_interface__,
-            # must be relative to app root here for Dash download link
-            "download_href": os.path.join("static", zip_name)
-        }
-        progress_state["pct"] = 100
-        progress_state["btn-disabled"] = False
-        progress_state["current-task"] = f"Finished processing {filename}"
-        # disable polling
-        progress_state["running"] = False
-
-    # assign to the module-level variable, not a new local variable
-    global processing_thread
-    processing_thread = threading.Thread(target=worker)
-    processing_thread.start()
+    # queue the job; a refused job reports why in its progress state
+    job_id = upload["job_id"]
+    submit_job(job_id, process_job, job_id, upload["filename"])
+    if get_job_progress(job_id) is None:
+        # job expired (see `cleanup_jobs`), the file has to be uploaded again
+        raise PreventUpdate
 
-    # no data returned but store write action will trigger update_progress
-    return True
+    # the job id will trigger update_progress
+    return job_id
 
 @app.callback(
     Output("progress", "value"),
@@ -405,35 +442,39 @@ def start_processing(_, filename, upload_ready):
     Output("btn-download", "style"),
     Output("geojson-store-full", "data"),
     Output("upload-zip", "disabled"),
+    Output("progress-version", "data"),
     Input("progress-poller", "n_intervals"), # initially None
     Input("processing-started", "data"), # will (re)activate the poller
+    State("progress-version", "data"),
     prevent_initial_call=True
 )
-def update_progress(*_):
-    # reset or increment dots
-    current_task = progress_state.get("current-task", "")
-    prev_task = progress_state.get("previous-task", None)
-    if current_task != prev_task:
-        progress_state["dot-count"] = 0
-    else:
-        progress_state["dot-count"] = (progress_state["dot-count"] + 1) % 4
-    progress_state["previous-task"] = current_task
-    dots = "." * progress_state["dot-count"] if progress_state.get("show-dots") else ""
-
-    current_task = progress_state.get("current-task", "") + dots
-    btn_disabled = progress_state.get("btn-disabled", False)
-    # disable poller once the background processing thread reports finished
-    poller_disabled = not progress_state.get("running", True)
-    pct = progress_state.get("pct", 0)
+def update_progress(_, job_id, last_version):
+    progress = get_job_progress(job_id) if job_id else None
+    if progress is None:
+        raise PreventUpdate
+
+    # skip poller ticks without progress (a new job is always shown)
+    version = progress_version(progress)
+    if version == last_version and ctx.triggered_id == "progress-poller":
+        raise PreventUpdate
+
+    # animated dots are drawn by the browser (see assets/progress.css)
+    current_task = progress.get("current-task", "")
+    if progress.get("show-dots"):
+        current_task = [current_task, html.Span(className="progress-dots")]
+    btn_disabled = progress.get("btn-disabled", False)
+    # disable poller once the job reports finished
+    poller_disabled = not progress.get("running", True)
+    pct = progress.get("pct", 0)
     label = f"{pct}%" if pct >= 5 else ""
-    href = progress_state.get("store_data", {}).get("download_href")
+    href = progress.get("store_data", {}).get("download_href")
     style = {"width": "40%", "display": "block" if pct >= 100 else "none"}
 
     # Only update store when ready
-    store_data = progress_state.get("store_data") if pct >= 100 else no_update
+    store_data = progress.get("store_data") if pct >= 100 else no_update
 
     outputs = (pct, label, poller_disabled, current_task,
-           btn_disabled, btn_disabled, href, style, store_data, btn_disabled)
+           btn_disabled, btn_disabled, href, style, store_data, btn_disabled, version)
 
     return outputs
 
@@ -450,119 +491,27 @@ def filter_data(store, start_date, end_date):
     """Filter bike segments and nodes by date and compute KPIs.
 
     Args:
-        store (dict): Original GeoJSON data with 'segments' and 'nodes'.
+        store (dict): Store with the 'result_id' of the matched segments and nodes.
         start_date (str): Start date (YYYY-MM-DD), defaults to earliest date.
         end_date (str): End date (YYYY-MM-DD), defaults to latest date.
 
     Returns:
-        tuple: (total_segments, total_nodes, total_length, filtered GeoJSON dict)
+        tuple: (total_segments, total_nodes, total_length, filtered store with the
+        result id and date range)
     """
-    if not store or not store.get("segments", {}).get("features"):
+    if not store or not store.get("result_id"):
         return None, None, None, {}
 
-    gdf_segments = gpd.GeoDataFrame.from_features(store["segments"]["features"])
-    gdf_nodes = gpd.GeoDataFrame.from_features(store["nodes"]["features"])
-
-    gdf_segments["gpx_date"] = pd.to_datetime(gdf_segments["gpx_date"]).dt.date
-    gdf_nodes["gpx_date"] = pd.to_datetime(gdf_nodes["gpx_date"]).dt.date
-
     try:
-        start = pd.to_datetime(start_date).date() if start_date else gdf_segments["gpx_date"].min()
-        end = pd.to_datetime(end_date).date() if end_date else gdf_segments["gpx_date"].max()
+        start = pd.to_datetime(start_date).date() if start_date else None
+        end = pd.to_datetime(end_date).date() if end_date else None
     except Exception:
         return None, None, None, {}
 
-    seg_mask = (gdf_segments["gpx_date"] >= start) & (gdf_segments["gpx_date"] <= end)
-    node_mask = (gdf_nodes["gpx_date"] >= start) & (gdf_nodes["gpx_date"] <= end)
-
-    gdf_segments_filtered = gdf_segments.loc[seg_mask]
-    gdf_nodes_filtered = gdf_nodes.loc[node_mask]
-
-    # Helper function for building tooltip
-    def build_tooltip(label_prefix, label_value, kpi_dict):
-        # First line: prefix in light grey, value in black and larger font
-        tooltip_lines = [
-            f'<span style="color: #999; font-size: 14px;">{label_prefix}</span>'
-            f'<span style="color: #000; font-size: 16px; font-weight: bold;">{label_value}</span>'
-            '<br>'  # simple line break for spacing
-        ]
-        
-        # KPI lines in smaller font
-        for kpi_name, kpi_value in kpi_dict.items():
-            tooltip_lines.append(
-                f'<span style="color: #999; font-size: 11px;">{kpi_name}: </span>'
-                f'<b style="color: #000; font-size: 11px;">{kpi_value}</b>'
-            )
-        return "<br>".join(tooltip_lines)
-
-    # -- Aggregate segments --
-    gdf_segments_filtered["gpx_date"] = pd.to_datetime(gdf_segments_filtered["gpx_date"])
-    # Use dropna=False to keep groups with missing keys e.g. missing osm_id_from/to
-    agg_seg = gdf_segments_filtered.groupby((["ref", "osm_id", "osm_id_from", "osm_id_to"]), dropna=False).agg(
-        length_km=("length_km", "max"),
-        count_gpx=("gpx_name", "nunique"),
-        max_overlap_percentage=("overlap_percentage", "max"),
-        first_date=("gpx_date", "min"),
-        last_date=("gpx_date", "max"),
-        # preserve geometry
-        geometry=("geometry", "first")
-    ).reset_index()
-
-    agg_seg = gpd.GeoDataFrame(agg_seg, geometry="geometry", crs=gdf_segments_filtered.crs)
-
-    # Apply formatting and sort result
-    agg_seg["length_km"] = agg_seg["length_km"].round(2)
-    agg_seg["max_overlap_percentage"] = agg_seg["max_overlap_percentage"].round(2)
-    agg_seg["first_date"] = agg_seg["first_date"].dt.strftime("%Y-%m-%d")
-    agg_seg["last_date"] = agg_seg["last_date"].dt.strftime("%Y-%m-%d")
-    agg_seg = agg_seg.sort_values("count_gpx", ascending=False)
-
-    # Add tooltip
-    agg_seg["tooltip"] = agg_seg.apply(
-        lambda row: build_tooltip(
-            "Segment ",
-            row["ref"],
-            {
-                "Visits (GPX)": row["count_gpx"],
-                "First visit": row["first_date"],
-                "Last visit": row["last_date"],
-                "Length (km)": f'{row["length_km"]:.1f}',
-                "Best match (%)": f'{100*row["max_overlap_percentage"]:.0f}%'
-            }
-        ),
-        axis=1
-    )
-
-    # -- Aggregate nodes --
-    gdf_nodes_filtered["gpx_date"] = pd.to_datetime(gdf_nodes["gpx_date"])
-    # Use dropna=False to keep groups with missing keys e.g. missing osm_id_from/to
-    agg_nodes = gdf_nodes_filtered.groupby(["rcn_ref", "osm_id"], dropna=False).agg(
-        count_gpx=("gpx_date", "nunique"),
-        first_date=("gpx_date", "min"),
-        last_date=("gpx_date", "max"),
-        # preserve geometry
-        geometry=("geometry", "first")
-    ).reset_index()
-    agg_nodes = gpd.GeoDataFrame(agg_nodes, geometry="geometry", crs=gdf_nodes_filtered.crs)
-
-    # Apply formatting and sort result
-    agg_nodes["first_date"] = agg_nodes["first_date"].dt.strftime("%Y-%m-%d")
-    agg_nodes["last_date"] = agg_nodes["last_date"].dt.strftime("%Y-%m-%d")
-    agg_nodes = agg_nodes.sort_values("count_gpx", ascending=False)
-
-    # Add tooltip
-    agg_nodes["tooltip"] = agg_nodes.apply(
-        lambda row: build_tooltip(
-            "Node ",
-            row["rcn_ref"],
-            {
-                "Visits (GPX)": row["count_gpx"],
-                "First visit": row["first_date"],
-                "Last visit": row["last_date"],
-            }
-        ),
-        axis=1
-    )
+    # date-filtered aggregates, kept server-side for the map and table callbacks
+    agg_seg, agg_nodes = filter_results(store["result_id"], start, end)
+    if agg_seg is None:
+        return None, None, None, {}
 
     # Calculate KPIs
     total_segments = len(agg_seg)
@@ -574,28 +523,73 @@ def filter_data(store, start_date, end_date):
         total_nodes,
         total_length,
         {
-            "segments": agg_seg.__geo_interface__,
-            "nodes": agg_nodes.__geo_interface__
+            "result_id": store["result_id"],
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None
         }
     )
 
+def filtered_key(filtered_data):
+    """Return the (result id, start date, end date) referenced by the filtered store."""
+    start = datetime.date.fromisoformat(filtered_data["start"]) if filtered_data.get("start") else None
+    end = datetime.date.fromisoformat(filtered_data["end"]) if filtered_data.get("end") else None
+    return filtered_data["result_id"], start, end
+
+def load_filtered(filtered_data):
+    """Return the aggregated segments and nodes referenced by the filtered store (see `filter_results`)."""
+    return filter_results(*filtered_key(filtered_data))
+
+def load_highlight_index(filtered_data):
+    """Return the highlight index of the filtered store (see `highlight_index`)."""
+    return highlight_index(*filtered_key(filtered_data))
+
+@app.callback(
+    Output("map-level", "data"),
+    Input("map", "zoom"),
+    State("map-level", "data"),
+    prevent_initial_call=True
+)
+def update_map_level(zoom, current_level):
+    """Store the map level of the current zoom, only when it changes.
+
+    Zooming within a level leaves the store untouched, so the segment and
+    network layers are not rebuilt or refetched.
+
+    Args:
+        zoom (int): Current map zoom.
+        current_level (int): Map level in the store.
+
+    Returns:
+        int: Index into `MAP_LEVELS`.
+    """
+    if zoom is None or map_level(zoom) == current_level:
+        raise PreventUpdate
+    return map_level(zoom)
+
 @app.callback(
     Output("layer-segments", "children"),
     Input("geojson-store-filtered", "data"),
+    Input("map-level", "data"),
 )
-def update_segments(filtered_data):
+def update_segments(filtered_data, level):
     """Render filtered bike segments on the map.
 
     Args:
-        filtered_data (dict): Filtered GeoJSON data.
+        filtered_data (dict): Filtered store with the result id and date range.
+        level (int): Map level of the current zoom, selects the segment resolution.
 
     Returns:
         dl.GeoJSON or None: Segment layer component.
     """
     if not filtered_data:
         return None
+    agg_seg, _ = load_filtered(filtered_data)
+    if agg_seg is None:
+        return None
+    if level is None:
+        level = map_level(initial_zoom)
     return dl.GeoJSON(
-        data=filtered_data["segments"],
+        data=with_map_level(agg_seg, level, map_level_geoms).__geo_interface__,
         id="geojson-seg",
         options=dict(style=dict(color=color_match, weight=5))
     )
@@ -609,16 +603,19 @@ def update_nodes(filtered_data, cluster_radius):
     """Render bike nodes
 
     Args:
-        filtered_data (dict): Filtered and aggregated GeoJSON data.
+        filtered_data (dict): Filtered store with the result id and date range.
 
     Returns:
         dl.GeoJSON or None: Node layer component.
     """
     if not filtered_data:
         return None
+    _, agg_nodes = load_filtered(filtered_data)
+    if agg_nodes is None:
+        return None
     else:
         return dl.GeoJSON(
-            data=filtered_data["nodes"],
+            data=agg_nodes.__geo_interface__,
             cluster=True,
             zoomToBoundsOnClick=True,
             superClusterOptions={"radius": cluster_radius}
@@ -635,7 +632,7 @@ def update_aggregated_tables(filtered_data):
     """Aggregate segment and node data for display in Dash tables.
 
     Args:
-        filtered_data (dict): GeoJSON-like dictionary with "segments" and "nodes" features.
+        filtered_data (dict): Filtered store with the result id and date range.
 
     Returns:
         tuple: 
@@ -646,12 +643,13 @@ def update_aggregated_tables(filtered_data):
     """
     if not filtered_data:
         return [], [], [], []
-    
-    agg_seg = gpd.GeoDataFrame.from_features(filtered_data["segments"]["features"])
-    agg_nodes = gpd.GeoDataFrame.from_features(filtered_data["nodes"]["features"])
-    
-    # remove the geometry
-    agg_seg = agg_seg.drop(columns="geometry")
+
+    agg_seg, agg_nodes = load_filtered(filtered_data)
+    if agg_seg is None:
+        return [], [], [], []
+
+    # remove the geometry (and the internal network row of the segments)
+    agg_seg = agg_seg.drop(columns=["geometry", "segment_position"])
     agg_nodes = agg_nodes.drop(columns="geometry")
 
     seg_columns = [{"name": c, "id": c} for c in agg_seg.columns]
@@ -663,13 +661,12 @@ def update_aggregated_tables(filtered_data):
 
 @app.callback(
     Output("browse-info", "children"),
-    Input("upload-zip", "contents"), # input required (also in def)
-    State('upload-zip', 'filename')
+    Input("upload-ready", "data"), # set by assets/upload.js once the file is on the server
 )
-def show_info(_, f):
-    if f is None:
+def show_info(upload):
+    if not upload:
         return "No file selected"
-    return f"Selected file: {f}"
+    return f"Selected file: {upload['filename']}"
 
 @app.callback(
     Output('geojson-network', 'options'),
@@ -694,6 +691,25 @@ def toggle_network_visibility(selected):
         return dict(style=dict(color=color_network, weight=1, opacity=0.6))
     return dict(style=dict(color=color_network, weight=1, opacity=0))
 
+@app.callback(
+    Output("geojson-network", "url"),
+    Input("map-level", "data"),
+    prevent_initial_call=True
+)
+def update_network_level(level):
+    """
+    Switch the network layer to the simplification level of the current zoom.
+
+    Args:
+        level (int): Map level of the current zoom.
+
+    Returns:
+        str: URL of the network layer level.
+    """
+    if level is None:
+        raise PreventUpdate
+    return network_layer_url(level)
+
 @app.callback(
     Output("map", "center"),
     Output("map", "zoom"),
@@ -715,87 +731,84 @@ def reset_map(n_clicks):
 @app.callback(
     Output("layer-selected-segments", "children"),
     Input("table-segments-agg", "selected_rows"),
-    State("table-segments-agg", "data"),
     State("geojson-store-filtered", "data"),
 )
-def highlight_selected_segments(selected_rows, table_data, filtered_data):
+def highlight_selected_segments(selected_rows, filtered_data):
     """Highlight selected segments on the map.
 
-    Filters the segment GeoDataFrame by the selected rows from the
-    aggregated table and returns a GeoJSON layer with highlighted
-    geometry.
+    Looks up the pre-serialized features of the selected rows from the
+    aggregated table in the server-side highlight index and returns a
+    GeoJSON layer with highlighted geometry.
 
     Args:
         selected_rows (list[int]): Indices of selected rows in the segments table.
-        table_data (list[dict]): Data from the aggregated segments table.
-        filtered_data (dict): Filtered GeoJSON data containing segments.
+        filtered_data (dict): Filtered store with the result id and date range.
 
     Returns:
         dl.GeoJSON or None: Highlighted GeoJSON layer if matches are found,
         otherwise None.
     """
-    if not selected_rows or not filtered_data or "segments" not in filtered_data:
+    if not selected_rows or not filtered_data:
         return None
 
-    # Get all selected 'ref' values
-    ref_values = [table_data[i]["osm_id"] for i in selected_rows]
+    index = load_highlight_index(filtered_data)
+    if index is None:
+        return None
 
-    # Convert filtered segments to GeoDataFrame
-    gdf_seg = gpd.GeoDataFrame.from_features(filtered_data["segments"]["features"])
+    # Get all selected 'osm_id' values (table rows are in aggregation order)
+    ref_values = [index["segment_ids"][i] for i in selected_rows if i < len(index["segment_ids"])]
 
-    # Filter for the selected segments
-    selected_geom = gdf_seg[gdf_seg["osm_id"].isin(ref_values)]
+    # Collect the selected segments
+    selected_geom = highlight_features(index, "by_segment", ref_values)
 
-    if selected_geom.empty:
+    if selected_geom is None:
         return None
 
     # Return GeoJSON layer for all selected segments
     return dl.GeoJSON(
-        data=selected_geom.__geo_interface__,
+        data=selected_geom,
         options=dict(style=dict(color=color_highlight_segment, weight=6))
     )
 
 @app.callback(
     Output("layer-selected-nodes", "children"),
     Input("table-nodes-agg", "selected_rows"),
-    State("table-nodes-agg", "data"),
     State("geojson-store-filtered", "data"),
 )
-def highlight_segments_from_nodes(selected_node_rows, node_data, filtered_data):
+def highlight_segments_from_nodes(selected_node_rows, filtered_data):
     """Highlight segments connected to selected nodes on the map.
 
-    Uses selected node IDs from the aggregated nodes table to filter
-    segments where either endpoint matches, then returns a GeoJSON
-    layer with highlighted geometry.
+    Uses selected node IDs from the aggregated nodes table to look up the
+    segments where either endpoint matches in the server-side highlight
+    index, then returns a GeoJSON layer with highlighted geometry.
 
     Args:
         selected_node_rows (list[int]): Indices of selected rows in the nodes table.
-        node_data (list[dict]): Data from the aggregated nodes table.
-        filtered_data (dict): Filtered and aggregated GeoJSON data containing segments.
+        filtered_data (dict): Filtered store with the result id and date range.
 
     Returns:
         dl.GeoJSON or None: Highlighted GeoJSON layer if matching segments exist,
         otherwise None.
     """
-    if not selected_node_rows or not filtered_data or "segments" not in filtered_data:
+    if not selected_node_rows or not filtered_data:
         return None  # nothing selected
 
-    # Get selected node IDs or refs
-    selected_nodes = [node_data[i]["osm_id"] for i in selected_node_rows]
+    index = load_highlight_index(filtered_data)
+    if index is None:
+        return None
 
-    # Convert filtered segments to GeoDataFrame
-    gdf_seg = gpd.GeoDataFrame.from_features(filtered_data["segments"]["features"])
+    # Get selected node IDs (table rows are in aggregation order)
+    selected_nodes = [index["node_ids"][i] for i in selected_node_rows if i < len(index["node_ids"])]
 
-    # Filter segments where node_from or node_to is in selected_nodes
-    mask = gdf_seg["osm_id_from"].isin(selected_nodes) | gdf_seg["osm_id_to"].isin(selected_nodes)
-    gdf_highlight = gdf_seg[mask]
+    # Collect segments where node_from or node_to is in selected_nodes
+    gdf_highlight = highlight_features(index, "by_node", selected_nodes)
 
-    if gdf_highlight.empty:
+    if gdf_highlight is None:
         return None
 
     # Return GeoJSON layer with blue highlight
     return dl.GeoJSON(
-        data=gdf_highlight.__geo_interface__,
+        data=gdf_highlight,
         options=dict(style=dict(color=color_highlight_node, weight=5))
     )
 
@@ -1,25 +1,114 @@
 from core.common import *
-from shapely.geometry import LineString, MultiLineString
+from app.result_cache import *
+import datetime
+import gc
+import atexit
+import numpy as np
+import psutil
+import shapely
 import shutil
+import threading
+import time
 import zipfile
 from lxml import etree
 from concurrent.futures import ProcessPoolExecutor, as_completed
-# import time # for testing optimization: start/stop = time.time() (in s)
 
 # --- geoprocessing parameters --- 
 buffer_distance = 20  # in meters
 intersect_threshold = 0.75
+# "buffer": intersect network segments with buffered tracks (polygon operations)
+# "distance": share of densified segment sample points within buffer_distance of a track
+match_engine = "buffer"
+sample_spacing = 5  # in meters, distance between sample points ("distance" engine only)
+# max. number of vertices per track piece queried against the sample points ("distance" engine only)
+track_piece_vertices = 32
+
+# --- track simplification parameters (applied after reprojection, before matching) ---
+track_dedup_distance = 1  # in meters, drop consecutive points closer than this (0 = off)
+track_simplify_tolerance = 2  # in meters, well below buffer_distance (0 = off)
+
+# --- parsing parameters ---
+# "stream": read GPX members straight from the ZIP with an incremental parser
+# "extract": unzip to a temp folder and parse every file as a full tree
+parse_mode = "stream"
+GPX_NS = "{http://www.topografix.com/GPX/1/1}"
+# initial number of trackpoints in the coordinate buffer (doubles when full)
+PARSE_BUFFER_SIZE = 4096
+# compiled XPath expressions for bulk coordinate extraction (plain strings, no element refs)
+GPX_XPATH_NS = {"gpx": "http://www.topografix.com/GPX/1/1"}
+xpath_trkseg = etree.XPath("//gpx:trk/gpx:trkseg", namespaces=GPX_XPATH_NS)
+xpath_trkpt_lon = etree.XPath("gpx:trkpt/@lon", namespaces=GPX_XPATH_NS, smart_strings=False)
+xpath_trkpt_lat = etree.XPath("gpx:trkpt/@lat", namespaces=GPX_XPATH_NS, smart_strings=False)
+
+# --- caching parameters ---
+# reuse matched results of GPX files that were processed before (see app/result_cache.py)
+USE_RESULT_CACHE = True
+
+# --- batching parameters ---
+# number of GPX files parsed and matched per batch; intermediates are freed between batches (0 = all at once)
+MATCH_CHUNK_SIZE = 200
+# optional resident memory budget in MB: the batch size halves when a batch ends above it
+# and doubles when it ends below half of it (None = fixed batch size)
+MATCH_MEMORY_BUDGET_MB = None
 
 # --- concurrency parameters ---
 # Minimum number of files before we even consider parallel parsing
 PARALLEL_MIN_FILES = 20
 # Minimum number of logical CPU cores required to enable parallel parsing (local only)
 PARALLEL_MIN_CORES = 2
+# number of GPX files parsed and matched per worker task
+PARSE_TASK_FILES = 10
 
 # -- application parameters --
+# default progress state (the app passes a separate one per job, see app/jobs.py)
 progress_state = {}
+# densified sample points of the last network used by the "distance" engine
+network_samples = {}
+# persistent process pool for parallel parsing and matching, started on first use
+# (see `get_worker_pool`), and the network/parameters it was started with
+worker_pool = None
+worker_pool_key = None
+# guards starting/restarting the pool when several jobs run at once
+worker_pool_lock = threading.Lock()
+# bike network and matching parameters of a worker process (set by `init_worker`)
+worker_state = {}
+
+# --- helper functions at module level (picklable) ---
+def build_track_geometry(coords, counts):
+    """
+    Build a track geometry from a flat coordinate array in a single vectorized call.
+
+    Args:
+        coords (np.ndarray): (n, 2) array of lon/lat coordinates of all segments.
+        counts (np.ndarray): Number of points per segment (each >= 2), summing to n.
+
+    Returns:
+        LineString or MultiLineString: One line per segment, merged if there are several.
+    """
+    line_segments = shapely.linestrings(coords, indices=np.repeat(np.arange(len(counts)), counts))
+    return line_segments[0] if len(line_segments) == 1 else shapely.multilinestrings(line_segments)
+
+def track_record(gpx_file, gpx_date, activity_type, coords, counts):
+    """
+    Assemble the parse result of one GPX file.
+
+    Args:
+        gpx_file (str): Name of the GPX file (used for `gpx_name`).
+        gpx_date (date): Date of the first trackpoint.
+        activity_type (str): Activity type, or None.
+        coords (np.ndarray): (n, 2) array of lon/lat coordinates of all segments.
+        counts (np.ndarray): Number of points per segment (each >= 2), summing to n.
+
+    Returns:
+        dict: 'gpx_name', 'gpx_date', 'geometry' and 'activity_type'.
+    """
+    return {
+        "gpx_name": os.path.basename(gpx_file),
+        "gpx_date": gpx_date,
+        "geometry": build_track_geometry(coords, counts),
+        "activity_type": activity_type
+    }
 
-# --- helper function at module level (picklable) ---
 def parse_single_gpx(gpx_file, zip_folder):
     gpx_path = os.path.join(zip_folder, gpx_file)
     tree = etree.parse(gpx_path)
@@ -37,43 +126,600 @@ def parse_single_gpx(gpx_file, zip_folder):
     if time_elem is not None:
         gpx_date = pd.to_datetime(time_elem.text, utc=True).date()
 
-    # Extract line segments
-    line_segments = []
-    for seg in root.findall(".//gpx:trk/gpx:trkseg", namespaces=ns):
-        pts = [(float(p.attrib["lon"]), float(p.attrib["lat"]))
-               for p in seg.findall("gpx:trkpt", namespaces=ns)]
-        if len(pts) > 1:
-            line_segments.append(LineString(pts))
+    # Extract line segments: coordinate strings in bulk per segment, converted once
+    lon, lat, counts = [], [], []
+    for seg in xpath_trkseg(root):
+        seg_lon = xpath_trkpt_lon(seg)
+        lon += seg_lon
+        lat += xpath_trkpt_lat(seg)
+        counts.append(len(seg_lon))
+    counts = np.array(counts, dtype=np.int64)
+    coords = np.column_stack([np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64)])
+
+    # drop segments with fewer than two points
+    keep = counts > 1
+    if not keep.any() or gpx_date is None:
+        return None
+    coords = coords[np.repeat(keep, counts)]
+
+    return track_record(gpx_file, gpx_date, activity_type, coords, counts[keep])
+
+def parse_gpx_stream(gpx_stream, gpx_file):
+    """
+    Parse a GPX file object incrementally without building the full tree.
+
+    Trackpoints are read with `etree.iterparse` and cleared as soon as their
+    coordinates are copied into a NumPy buffer, so memory stays bounded by the
+    number of points rather than by the size of the XML document.
+
+    Args:
+        gpx_stream (file-like): Binary file object, e.g. from `ZipFile.open`.
+        gpx_file (str): Name of the GPX file (used for `gpx_name`).
 
-    if not line_segments or gpx_date is None:
+    Returns:
+        dict or None: Same structure as `parse_single_gpx`, or None if the
+        file has no usable track or no timestamp.
+    """
+    trkpt_tag = f"{GPX_NS}trkpt"
+    trkseg_tag = f"{GPX_NS}trkseg"
+    type_tag = f"{GPX_NS}type"
+    time_tag = f"{GPX_NS}time"
+
+    activity_type = None
+    gpx_date = None
+    coords = np.empty((PARSE_BUFFER_SIZE, 2), dtype=np.float64)
+    n_points = 0
+    seg_start = 0
+    seg_counts = []
+
+    context = etree.iterparse(gpx_stream, events=("end",), tag=(trkpt_tag, trkseg_tag, type_tag))
+    for _, elem in context:
+        if elem.tag == trkpt_tag:
+            if n_points == len(coords):
+                coords = np.concatenate([coords, np.empty_like(coords)])
+            coords[n_points, 0] = float(elem.attrib["lon"])
+            coords[n_points, 1] = float(elem.attrib["lat"])
+            n_points += 1
+            # start time = time of the first trackpoint
+            if gpx_date is None:
+                time_text = elem.findtext(time_tag)
+                if time_text is not None:
+                    gpx_date = pd.to_datetime(time_text, utc=True).date()
+        elif elem.tag == trkseg_tag:
+            # keep segments with at least two points, drop the others
+            if n_points - seg_start > 1:
+                seg_counts.append(n_points - seg_start)
+            else:
+                n_points = seg_start
+            seg_start = n_points
+        elif activity_type is None:
+            activity_type = elem.text
+
+        # free the processed element and its already handled siblings
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    del context
+
+    if not seg_counts or gpx_date is None:
         return None
 
-    geom = MultiLineString(line_segments) if len(line_segments) > 1 else line_segments[0]
+    return track_record(gpx_file, gpx_date, activity_type, coords[:n_points], np.array(seg_counts))
+
+def parse_zip_member(zip_ref, gpx_file):
+    """Stream-parse one GPX member of an open ZIP archive."""
+    with zip_ref.open(gpx_file) as gpx_stream:
+        return parse_gpx_stream(gpx_stream, gpx_file)
+
+def build_network_index(bike_network):
+    """
+    Return the spatial index (STRtree) of the bike network segments.
+
+    GeoPandas caches the index on the GeoDataFrame, so calling this once at
+    startup builds the tree a single time and every upload queries the same
+    tree. `gpd.sjoin` would instead build a new tree over the GPX buffers on
+    every call.
+
+    Args:
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+
+    Returns:
+        SpatialIndex: Index over `bike_network.geometry`.
+    """
+    return bike_network.sindex
+
+def network_sample_points(bike_network, spacing=None):
+    """
+    Densify the network segments into evenly spaced sample points.
+
+    Every segment of length L is split into n = ceil(L / spacing) equal
+    pieces and sampled at the midpoint of each piece, so every sample
+    stands for the same share of its segment. The points and an STRtree over
+    them are built once and cached for the last network used.
+
+    Args:
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+        spacing (float, optional): Distance between sample points in meters.
+            Defaults to `sample_spacing`.
+
+    Returns:
+        dict: 'tree' (STRtree over the sample points), 'segment' (segment
+        position per sample) and 'counts' (number of samples per segment).
+    """
+    spacing = sample_spacing if spacing is None else spacing
+    geoms = bike_network.geometry.values
+    if network_samples.get("geoms") is geoms and network_samples.get("spacing") == spacing:
+        return network_samples
+
+    segment_geoms = np.asarray(geoms)
+    lengths = shapely.length(segment_geoms)
+    counts = np.maximum(np.ceil(lengths / spacing), 1).astype(np.int64)
+    segment_of_sample = np.repeat(np.arange(len(counts)), counts)
+    first_sample = np.cumsum(counts) - counts
+    piece = np.arange(counts.sum()) - first_sample[segment_of_sample]
+    points = shapely.line_interpolate_point(
+        segment_geoms[segment_of_sample],
+        (piece + 0.5) * (lengths / counts)[segment_of_sample]
+    )
+
+    network_samples.clear()
+    network_samples.update(
+        geoms=geoms,
+        spacing=spacing,
+        tree=shapely.STRtree(points),
+        segment=segment_of_sample,
+        counts=np.where(lengths > 0, counts, 0)
+    )
+    return network_samples
+
+def simplify_tracks(track_geoms, params=None, verbose=True):
+    """
+    Remove near-duplicate points and simplify projected tracks before matching.
+
+    Consecutive points closer than `track_dedup_distance` (e.g. while stopped)
+    are dropped first, then the tracks are simplified with Douglas-Peucker and
+    `track_simplify_tolerance`. Both thresholds are far below `buffer_distance`,
+    so the matches do not change while buffering and intersecting get cheaper.
+
+    Args:
+        track_geoms (np.ndarray): Track geometries in EPSG:3812.
+        params (dict, optional): Matching parameters. Defaults to `matching_params()`.
+        verbose (bool, optional): Print the point reduction. Defaults to True.
+
+    Returns:
+        np.ndarray: Simplified track geometries.
+    """
+    params = matching_params() if params is None else params
+    n_points = [shapely.get_num_coordinates(track_geoms).sum()]
+    timings = []
+    if params["track_dedup_distance"] > 0:
+        start = time.perf_counter()
+        track_geoms = shapely.remove_repeated_points(track_geoms, params["track_dedup_distance"])
+        timings.append(f"dedup {time.perf_counter() - start:.2f} s")
+        n_points.append(shapely.get_num_coordinates(track_geoms).sum())
+    if params["track_simplify_tolerance"] > 0:
+        start = time.perf_counter()
+        track_geoms = shapely.simplify(track_geoms, params["track_simplify_tolerance"], preserve_topology=False)
+        timings.append(f"simplify {time.perf_counter() - start:.2f} s")
+        n_points.append(shapely.get_num_coordinates(track_geoms).sum())
+
+    if timings and verbose:
+        reduction = 100 * (1 - n_points[-1] / max(n_points[0], 1))
+        print(f"Track points: {' -> '.join(str(n) for n in n_points)} (-{reduction:.1f}%), {', '.join(timings)}")
+    return track_geoms
+
+def split_lines(geoms, max_vertices):
+    """
+    Split (multi)line geometries into short pieces with tight bounding boxes.
+
+    Consecutive pieces share their boundary vertex, so together they cover the
+    original lines exactly.
+
+    Args:
+        geoms (np.ndarray): LineString or MultiLineString geometries.
+        max_vertices (int): Maximum number of vertices per piece (>= 2).
+
+    Returns:
+        tuple: (pieces, owner) with the LineString pieces and the index of the
+        input geometry each piece belongs to.
+    """
+    parts, part_owner = shapely.get_parts(geoms, return_index=True)
+    coords = shapely.get_coordinates(parts)
+    part_n = shapely.get_num_coordinates(parts)
+    part_start = np.cumsum(part_n) - part_n
+
+    # pieces of `step` edges each, overlapping by one vertex
+    step = max_vertices - 1
+    n_pieces = np.maximum(np.ceil((part_n - 1) / step), 1).astype(np.int64)
+    piece_part = np.repeat(np.arange(len(parts)), n_pieces)
+    piece_rank = np.arange(n_pieces.sum()) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+    piece_start = part_start[piece_part] + piece_rank * step
+    piece_n = np.minimum(max_vertices, part_n[piece_part] - piece_rank * step)
+
+    vertex_idx = np.repeat(piece_start, piece_n) + (
+        np.arange(piece_n.sum()) - np.repeat(np.cumsum(piece_n) - piece_n, piece_n)
+    )
+    pieces = shapely.linestrings(coords[vertex_idx], indices=np.repeat(np.arange(len(piece_n)), piece_n))
+    return pieces, part_owner[piece_part]
+
+def stage_pct(pct_range, fraction):
+    """Map the progress of a processing stage (0-1) onto the progress bar range `pct_range`."""
+    return round(pct_range[0] + fraction * (pct_range[1] - pct_range[0]))
+
+def overlap_by_buffer(track_geoms, bike_network, pct_range=(60, 80), progress=None, params=None):
+    """
+    Overlap of network segments with buffered tracks (intersection length / segment length).
+
+    Args:
+        track_geoms (np.ndarray): Track geometries in EPSG:3812.
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+        pct_range (tuple, optional): Progress bar range of this stage. Defaults to (60, 80).
+        progress (dict, optional): Progress state to update. Defaults to `progress_state`.
+        params (dict, optional): Matching parameters. Defaults to `matching_params()`.
+
+    Returns:
+        tuple: (track_idx, segment_idx, overlap_percentage) arrays of all
+        candidate pairs, ordered by segment and then by track.
+    """
+    progress = progress_state if progress is None else progress
+    params = matching_params() if params is None else params
+    # --- buffer GPX geometries ---
+    progress["current-task"] = "Buffering GPX geometries"
+    progress["pct"] = stage_pct(pct_range, 0)
+    buffer_geoms = shapely.buffer(track_geoms, params["buffer_distance"])
+
+    # --- spatial join ---
+    progress["current-task"] = "Matching all GPX tracks with bike network"
+    progress["pct"] = stage_pct(pct_range, 0.25)
+    # query the (prebuilt) network index with all buffers in bulk
+    track_idx, segment_idx = build_network_index(bike_network).query(buffer_geoms, predicate="intersects")
+
+    # order candidate pairs by network segment, then by track
+    order = np.lexsort((track_idx, segment_idx))
+    track_idx, segment_idx = track_idx[order], segment_idx[order]
+
+    # --- intersection lengths ---
+    progress["current-task"] = "Calculating intersection lengths"
+    progress["pct"] = stage_pct(pct_range, 0.75)
+    segment_geoms = np.asarray(bike_network.geometry)[segment_idx]
+    segment_length = shapely.length(segment_geoms)
+    intersection_length = np.nan_to_num(
+        shapely.length(shapely.intersection(segment_geoms, buffer_geoms[track_idx]))
+    )
+    overlap_percentage = np.zeros(len(segment_idx))
+    mask = segment_length > 0
+    overlap_percentage[mask] = np.clip(intersection_length[mask] / segment_length[mask], 0, 1)
+    return track_idx, segment_idx, overlap_percentage
+
+def overlap_by_distance(track_geoms, bike_network, pct_range=(60, 80), progress=None, params=None):
+    """
+    Overlap of network segments with tracks, from densified segment sample points.
+
+    The overlap is the share of a segment's sample points that lie within
+    `buffer_distance` of the track, which approximates the length share of the
+    segment inside the track buffer without building any polygon.
+
+    Args:
+        track_geoms (np.ndarray): Track geometries in EPSG:3812.
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+        pct_range (tuple, optional): Progress bar range of this stage. Defaults to (60, 80).
+        progress (dict, optional): Progress state to update. Defaults to `progress_state`.
+        params (dict, optional): Matching parameters. Defaults to `matching_params()`.
+
+    Returns:
+        tuple: (track_idx, segment_idx, overlap_percentage) arrays of all
+        candidate pairs, ordered by segment and then by track.
+    """
+    progress = progress_state if progress is None else progress
+    params = matching_params() if params is None else params
+    progress["current-task"] = "Densifying bike network segments"
+    progress["pct"] = stage_pct(pct_range, 0)
+    samples = network_sample_points(bike_network, params["sample_spacing"])
+
+    # --- distance query ---
+    # short track pieces keep the query envelopes tight, even for long or multi-part tracks
+    progress["current-task"] = "Matching all GPX tracks with bike network sample points"
+    progress["pct"] = stage_pct(pct_range, 0.25)
+    pieces, piece_track = split_lines(track_geoms, track_piece_vertices)
+    piece_idx, sample_idx = samples["tree"].query(pieces, predicate="dwithin", distance=params["buffer_distance"])
+
+    # --- overlap per (segment, track) pair ---
+    progress["current-task"] = "Calculating overlap fractions"
+    progress["pct"] = stage_pct(pct_range, 0.75)
+    n_tracks = len(track_geoms)
+    # a sample point counts once per track, even if several pieces are close to it
+    track_sample = np.unique(sample_idx * n_tracks + piece_track[piece_idx])
+    sample_idx, track_idx = np.divmod(track_sample, n_tracks)
+    pair_keys, n_within = np.unique(samples["segment"][sample_idx] * n_tracks + track_idx, return_counts=True)
+    segment_idx, track_idx = np.divmod(pair_keys, n_tracks)
+    counts = samples["counts"][segment_idx]
+    overlap_percentage = np.zeros(len(segment_idx))
+    mask = counts > 0
+    overlap_percentage[mask] = np.clip(n_within[mask] / counts[mask], 0, 1)
+    return track_idx, segment_idx, overlap_percentage
+
+def match_gpx_tracks(all_gpx_gdf, bike_network, pct_range=(50, 90), progress=None, params=None, verbose=True):
+    """
+    Match parsed GPX tracks with the bike network segments.
+
+    Reprojects and simplifies the tracks, calculates the overlap percentage of every
+    candidate segment with the selected `match_engine` and keeps the segments
+    exceeding `intersect_threshold`.
+
+    Args:
+        all_gpx_gdf (GeoDataFrame): Parsed GPX tracks in EPSG:4326.
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+        pct_range (tuple, optional): Progress bar range of this stage. Defaults to (50, 90).
+        progress (dict, optional): Progress state to update. Defaults to `progress_state`.
+        params (dict, optional): Matching parameters. Defaults to `matching_params()`.
+        verbose (bool, optional): Print the point reduction and stage timings. Defaults to True.
+
+    Returns:
+        DataFrame: One row per matched (track, segment) pair with 'gpx_name',
+        'gpx_date', 'segment_position' (position in `bike_network`) and
+        'overlap_percentage' (empty if nothing matched).
+    """
+    progress = progress_state if progress is None else progress
+    params = matching_params() if params is None else params
+    stage_start = time.perf_counter()
+
+    # --- reproject ---
+    progress["show-dots"] = True
+    progress["current-task"] = "Reprojecting GPX geometries to Lambert 2008"
+    progress["pct"] = stage_pct(pct_range, 0)
+    all_gpx_gdf = all_gpx_gdf.to_crs("EPSG:3812")
+    track_geoms = np.asarray(all_gpx_gdf.geometry)
+    timings = [f"reproject {time.perf_counter() - stage_start:.2f} s"]
+
+    # --- simplify ---
+    stage_start = time.perf_counter()
+    progress["current-task"] = "Simplifying GPX tracks"
+    progress["pct"] = stage_pct(pct_range, 0.1)
+    track_geoms = simplify_tracks(track_geoms, params, verbose)
+    timings.append(f"simplify {time.perf_counter() - stage_start:.2f} s")
+
+    # --- overlap ---
+    stage_start = time.perf_counter()
+    overlap_range = (stage_pct(pct_range, 0.2), pct_range[1])
+    engine = params["match_engine"]
+    if engine == "distance":
+        track_idx, segment_idx, overlap_percentage = overlap_by_distance(
+            track_geoms, bike_network, overlap_range, progress, params)
+    else:
+        track_idx, segment_idx, overlap_percentage = overlap_by_buffer(
+            track_geoms, bike_network, overlap_range, progress, params)
+    timings.append(f"overlap ({engine}) {time.perf_counter() - stage_start:.2f} s")
+    if verbose:
+        print(f"Matching stages: {', '.join(timings)}")
+
+    if len(segment_idx) == 0:
+        progress["current-task"] = "No intersections found."
+
+    # --- filter and add GPX columns ---
+    # only positions are kept; segment rows are looked up once all batches are done
+    mask = overlap_percentage >= params["intersect_threshold"]
+    return pd.DataFrame({
+        "gpx_name": all_gpx_gdf["gpx_name"].to_numpy()[track_idx[mask]],
+        "gpx_date": all_gpx_gdf["gpx_date"].to_numpy()[track_idx[mask]],
+        "segment_position": segment_idx[mask],
+        "overlap_percentage": overlap_percentage[mask]
+    })
+
+def compact_results(gpx_gdf, matches):
+    """
+    Convert the matches of a batch of parsed GPX files into one compact result per file.
+
+    Args:
+        gpx_gdf (GeoDataFrame): Parsed GPX tracks of the batch.
+        matches (DataFrame): Matched pairs returned by `match_gpx_tracks`.
+
+    Returns:
+        dict: GPX name -> {"gpx_date": ISO date, "segments": [[position, overlap], ...]},
+        the same format as the result cache entries.
+    """
+    results = {
+        gpx_name: {"gpx_date": gpx_date.isoformat(), "segments": []}
+        for gpx_name, gpx_date in zip(gpx_gdf["gpx_name"], gpx_gdf["gpx_date"])
+    }
+    for gpx_name, position, overlap in zip(matches["gpx_name"], matches["segment_position"],
+                                           matches["overlap_percentage"]):
+        results[gpx_name]["segments"].append([int(position), float(overlap)])
+    return results
+
+def segments_from_results(bike_network, results):
+    """
+    Rebuild matched segment rows from compact per-file results.
+
+    The segment positions are rows of `bike_network`; cached results can only
+    be hit for the same network rows (see `network_fingerprint`).
+
+    Args:
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+        results (dict): GPX file name -> compact result (see `compact_results`).
+
+    Returns:
+        GeoDataFrame: Matched segments with 'gpx_name', 'gpx_date',
+        'overlap_percentage' and 'segment_position' (row in `bike_network`,
+        used to look up the map level geometries) added.
+    """
+    positions, gpx_names, gpx_dates, overlaps = [], [], [], []
+    for gpx_file, result in results.items():
+        for position, overlap in result["segments"]:
+            positions.append(position)
+            gpx_names.append(os.path.basename(gpx_file))
+            gpx_dates.append(datetime.date.fromisoformat(result["gpx_date"]))
+            overlaps.append(overlap)
+
+    segments = bike_network.iloc[positions].copy()
+    segments["gpx_name"] = gpx_names
+    segments["gpx_date"] = gpx_dates
+    segments["overlap_percentage"] = overlaps
+    segments["segment_position"] = positions
+    return segments
+
+# --- worker pool ---
+def matching_params():
+    """
+    Return the parameters that determine the matching result.
+
+    Returns:
+        dict: Parameter name -> current value.
+    """
     return {
-        "gpx_name": os.path.basename(gpx_file),
-        "gpx_date": gpx_date,
-        "geometry": geom,
-        "activity_type": activity_type
+        "buffer_distance": buffer_distance,
+        "intersect_threshold": intersect_threshold,
+        "match_engine": match_engine,
+        "sample_spacing": sample_spacing,
+        "track_dedup_distance": track_dedup_distance,
+        "track_simplify_tolerance": track_simplify_tolerance
     }
 
+def init_worker(bike_network, params):
+    """
+    Prepare a worker process for matching: store the network and build its indexes once.
+
+    The parameters of the parent are kept in `worker_state` and passed to the
+    matching functions, the module settings of the worker are left untouched.
+
+    Args:
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+        params (dict): Matching parameters of the parent (see `matching_params`).
+    """
+    worker_state.update(network=bike_network, params=params)
+    build_network_index(bike_network)
+    if params["match_engine"] == "distance":
+        network_sample_points(bike_network, params["sample_spacing"])
+
+def match_gpx_chunk(gpx_files, source, mode):
+    """
+    Parse and match several GPX files in a worker process.
+
+    Matching statistics are not printed per chunk; the parent reports per batch.
+
+    Args:
+        gpx_files (list): Names of the GPX files.
+        source (str): ZIP archive (`mode == "stream"`) or extracted folder.
+        mode (str): Parse mode, see `parse_mode`.
+
+    Returns:
+        dict: GPX name -> compact result (see `compact_results`) of the parsed files.
+    """
+    if mode == "stream":
+        with zipfile.ZipFile(source, 'r') as zip_ref:
+            gpx_rows = [parse_zip_member(zip_ref, gpx_file) for gpx_file in gpx_files]
+    else:
+        gpx_rows = [parse_single_gpx(gpx_file, source) for gpx_file in gpx_files]
+    gpx_rows = [row for row in gpx_rows if row]
+    if not gpx_rows:
+        return {}
+    gpx_gdf = gpd.GeoDataFrame(gpx_rows, crs="EPSG:4326")
+    matches = match_gpx_tracks(gpx_gdf, worker_state["network"], params=worker_state["params"], verbose=False)
+    return compact_results(gpx_gdf, matches)
+
+def get_worker_pool(bike_network):
+    """
+    Return the persistent process pool for parallel matching, starting it on first use.
+
+    The pool is shared by all uploads and restarted only when the network or the
+    matching parameters change. It is shut down when the app exits.
+
+    Args:
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+
+    Returns:
+        ProcessPoolExecutor: The worker pool.
+    """
+    global worker_pool, worker_pool_key
+    params = matching_params()
+    pool_key = (id(bike_network.geometry.values), tuple(params.items()))
+    with worker_pool_lock:
+        if worker_pool is not None and worker_pool_key != pool_key:
+            worker_pool.shutdown(cancel_futures=True)
+            worker_pool = None
+        if worker_pool is None:
+            if worker_pool_key is None:
+                atexit.register(shutdown_worker_pool)
+            worker_pool = ProcessPoolExecutor(initializer=init_worker, initargs=(bike_network, params))
+            worker_pool_key = pool_key
+        return worker_pool
+
+def shutdown_worker_pool():
+    """Shut down the persistent worker pool, if it was started."""
+    global worker_pool
+    if worker_pool is not None:
+        worker_pool.shutdown(cancel_futures=True)
+        worker_pool = None
+
+def extract_matched_nodes(all_segments, point_geodf):
+    """
+    Look up the bike nodes at both ends of every matched segment, per GPX track.
+
+    The `osm_id_from`/`osm_id_to` columns are melted into one (track, node id)
+    table, deduplicated and joined in one go with the node table indexed by
+    `osm_id`. The rows are ordered by track (name, date) and then by their
+    position in `point_geodf`.
+
+    Args:
+        all_segments (GeoDataFrame): Matched segments with 'gpx_name' and 'gpx_date'.
+        point_geodf (GeoDataFrame): GeoDataFrame of bike nodes.
+
+    Returns:
+        GeoDataFrame: Matched bike nodes with 'gpx_name' and 'gpx_date' added.
+    """
+    node_visits = (
+        all_segments[["gpx_name", "gpx_date", "osm_id_from", "osm_id_to"]]
+        .melt(id_vars=["gpx_name", "gpx_date"], value_name="osm_id")
+        .drop(columns="variable")
+        .dropna()
+        .drop_duplicates()
+    )
+    node_table = point_geodf.assign(node_order=np.arange(len(point_geodf))).set_index("osm_id")
+    matched_nodes = node_visits.merge(node_table, left_on="osm_id", right_index=True, how="inner")
+
+    if matched_nodes.empty:
+        return gpd.GeoDataFrame(columns=list(point_geodf.columns) + ["gpx_name", "gpx_date"])
+
+    matched_nodes = matched_nodes.sort_values(["gpx_name", "gpx_date", "node_order"])
+    columns = list(point_geodf.columns) + ["gpx_name", "gpx_date"]
+    return gpd.GeoDataFrame(
+        matched_nodes[columns].reset_index(drop=True),
+        geometry=point_geodf.geometry.name,
+        crs=point_geodf.crs
+    )
+
 # --- main function ---
-def process_gpx_zip(zip_file_path, bike_network, point_geodf):
+def process_gpx_zip(zip_file_path, bike_network, point_geodf, progress=None, network_id=None):
     """
     Process a ZIP archive of GPX files and match tracks with a bike network.
 
-    This function unzips the GPX files, parses each track into geometries,
-    buffers them, calculates overlap with the bike network segments, filters
-    segments exceeding the overlap threshold, and extracts corresponding bike nodes.
+    This function reads the GPX files from the ZIP, parses each track into
+    geometries, calculates overlap with the bike network segments (see
+    `match_engine`), filters segments exceeding the overlap threshold, and
+    extracts corresponding bike nodes.
+
+    Progress updates are written to `progress` (default: `progress_state`)
+    throughout the steps.
 
-    Progress updates are written to `progress_state` throughout the steps.
+    Uses sequential parsing and matching for a small number of files. Larger
+    ZIPs are split into chunks of files that are parsed and matched in parallel
+    on a persistent worker pool (see `get_worker_pool`). With `parse_mode == "stream"` the
+    GPX members are parsed directly from the archive; otherwise the ZIP is
+    extracted to a temporary folder next to the ZIP first.
 
-    Uses sequential parsing for a small number of files and parallel parsing
-    for larger ZIPs to improve performance.
+    With `USE_RESULT_CACHE`, the matched segments of every GPX file are cached
+    on disk by content hash, so re-uploads only process new or changed files.
+
+    New files are parsed and matched in batches of `MATCH_CHUNK_SIZE` (adapted
+    to `MATCH_MEMORY_BUDGET_MB` if set). Only compact per-file results are kept
+    between batches, so peak memory does not grow with the archive size.
 
     Args:
         zip_file_path (str): Path to the ZIP file containing GPX files.
         bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
         point_geodf (GeoDataFrame): GeoDataFrame of bike nodes.
+        progress (dict, optional): Progress state to update. Defaults to `progress_state`.
+        network_id (str, optional): Fingerprint of `bike_network` for the result
+            cache (see `network_fingerprint`). Computed here if not given.
 
     Returns:
         tuple:
@@ -85,152 +731,168 @@ def process_gpx_zip(zip_file_path, bike_network, point_geodf):
         concurrency was tested and performs well locally, but is not suitable
         on Render free tier due to limited CPU and memory.
     """
+    progress = progress_state if progress is None else progress
 
-    # --- unzip ---
-    zip_folder = os.path.join(UPLOAD_FOLDER, "temp")
-    if os.path.exists(zip_folder):
-        shutil.rmtree(zip_folder)
-    os.makedirs(zip_folder, exist_ok=True)
-    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-        zip_ref.extractall(zip_folder)
-
-    # list GPX files
-    gpx_files = [f for f in os.listdir(zip_folder) if f.lower().endswith(".gpx")]
+    if parse_mode == "stream":
+        # list top-level GPX members without extracting the archive
+        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+            gpx_files = [f for f in zip_ref.namelist() if f.lower().endswith(".gpx") and "/" not in f]
+    else:
+        # --- unzip ---
+        # (next to the ZIP, so uploads processed at the same time do not share it)
+        zip_folder = os.path.join(os.path.dirname(zip_file_path), "temp")
+        if os.path.exists(zip_folder):
+            shutil.rmtree(zip_folder)
+        os.makedirs(zip_folder, exist_ok=True)
+        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+            zip_ref.extractall(zip_folder)
+
+        # list GPX files
+        gpx_files = [f for f in os.listdir(zip_folder) if f.lower().endswith(".gpx")]
     total_files = len(gpx_files)
     if total_files == 0:
         return gpd.GeoDataFrame(), gpd.GeoDataFrame()
 
-    # --- parse GPX files ---
-    gpx_rows = []
+    # --- check result cache ---
+    cache_keys = {}
+    cached_results = {}
+    if USE_RESULT_CACHE:
+        progress["show-dots"] = False
+        cache_params = matching_params()
+        cache_network = network_fingerprint(bike_network) if network_id is None else network_id
+        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+            for i, gpx_file in enumerate(gpx_files, start=1):
+                progress["current-task"] = f"Checking result cache: {i}/{total_files}"
+                cache_keys[gpx_file] = gpx_cache_key(zip_ref.read(gpx_file), cache_params, cache_network)
+                result = load_cached_result(cache_keys[gpx_file])
+                if result is not None:
+                    cached_results[gpx_file] = result
+    new_files = [f for f in gpx_files if f not in cached_results]
+    total_new = len(new_files)
+    cache_info = f" (cache: {len(cached_results)} hits, {total_new} misses)" if USE_RESULT_CACHE else ""
+
+    # --- parse and match new GPX files in batches ---
     # added as environment variable in Render; used to disable parallel processing
     # on the free tier to prevent crashes or memory issues
     IS_RENDER = os.getenv("RENDER") == "true"
     use_parallel = (
         not IS_RENDER
         and os.cpu_count() >= PARALLEL_MIN_CORES
-        and total_files >= PARALLEL_MIN_FILES
-    )
-
-    if not use_parallel:
-        # Sequential parsing
-        for i, gpx_file in enumerate(gpx_files, start=1):
-            progress_state["show-dots"] = False
-            progress_state["current-task"] = f"Parsing GPX files (sequential): {i}/{total_files}"
-            progress_state["pct"] = round(i / total_files * 50)
-            result = parse_single_gpx(gpx_file, zip_folder)
-            if result:
-                gpx_rows.append(result)
-    else:
-        # Parallel parsing
-        futures = []
-        with ProcessPoolExecutor() as executor:
-            for gpx_file in gpx_files:
-                futures.append(executor.submit(parse_single_gpx, gpx_file, zip_folder))
-            for i, future in enumerate(as_completed(futures), start=1):
-                result = future.result()
-                if result:
-                    gpx_rows.append(result)
-                progress_state["current-task"] = f"Parsing GPX files (parallel): {i}/{total_files}"
-                progress_state["pct"] = round(i / total_files * 50)
-
-    if not gpx_rows:
-        return gpd.GeoDataFrame(), gpd.GeoDataFrame()
-
-    all_gpx_gdf = gpd.GeoDataFrame(gpx_rows, crs="EPSG:4326")
-
-    # --- reproject ---
-    progress_state["show-dots"] = True
-    progress_state["current-task"] = "Reprojecting GPX geometries to Lambert 2008"
-    progress_state["pct"] = 55
-    all_gpx_gdf = all_gpx_gdf.to_crs("EPSG:3812")
-
-    # --- buffer GPX geometries ---
-    progress_state["current-task"] = "Buffering GPX geometries"
-    progress_state["pct"] = 60
-    all_gpx_gdf["buffer_geom"] = all_gpx_gdf.geometry.buffer(buffer_distance)
-    gpx_buffers = all_gpx_gdf.set_geometry("buffer_geom")
-
-    # --- spatial join ---
-    progress_state["current-task"] = "Matching all GPX tracks with bike network"
-    progress_state["pct"] = 65
-    # keep the buffered geometry as the active geometry
-    joined = gpd.sjoin(
-        bike_network,
-        gpx_buffers[["gpx_name", "gpx_date", "buffer_geom"]].set_geometry("buffer_geom"),
-        how="inner",
-        predicate="intersects"
+        and total_new >= PARALLEL_MIN_FILES
     )
+    batch_size = MATCH_CHUNK_SIZE or total_new
+    new_results = {}
+    n_done = 0
 
-    if joined.empty:
-        progress_state["current-task"] = "No intersections found."
-        progress_state["pct"] = 100
+    parse_source = zip_file_path if parse_mode == "stream" else zip_folder
+    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+        while n_done < total_new:
+            batch = new_files[n_done:n_done + batch_size]
+            # every batch gets a slice of 0-90% proportional to its size (sequential: half parsing, half matching)
+            pct_start = n_done / total_new * 90
+            pct_end = (n_done + len(batch)) / total_new * 90
+            pct_mid = (pct_start + pct_end) / 2
+            batch_info = f" (batch of {len(batch)})" if len(batch) < total_new else ""
+
+            progress["show-dots"] = False
+            if not use_parallel:
+                # --- parse GPX files (sequential) ---
+                gpx_rows = []
+                for i, gpx_file in enumerate(batch, start=n_done + 1):
+                    if parse_mode == "stream":
+                        result = parse_zip_member(zip_ref, gpx_file)
+                    else:
+                        result = parse_single_gpx(gpx_file, zip_folder)
+                    if result:
+                        gpx_rows.append(result)
+                    progress["current-task"] = f"Parsing GPX files (sequential): {i}/{total_new}{cache_info}"
+                    progress["pct"] = round(pct_start + (i - n_done) / len(batch) * (pct_mid - pct_start))
+
+                # --- match GPX files ---
+                batch_results = {}
+                if gpx_rows:
+                    gpx_gdf = gpd.GeoDataFrame(gpx_rows, crs="EPSG:4326")
+                    matches = match_gpx_tracks(gpx_gdf, bike_network, (pct_mid, pct_end), progress)
+                    batch_results = compact_results(gpx_gdf, matches)
+                    del gpx_gdf, matches
+                del gpx_rows
+            else:
+                # --- parse and match GPX files (parallel) ---
+                # chunks of files are parsed and matched on the persistent pool; the
+                # results are combined in chunk order, independent of completion order
+                executor = get_worker_pool(bike_network)
+                file_chunks = [batch[k:k + PARSE_TASK_FILES] for k in range(0, len(batch), PARSE_TASK_FILES)]
+                futures = {
+                    executor.submit(match_gpx_chunk, file_chunk, parse_source, parse_mode): k
+                    for k, file_chunk in enumerate(file_chunks)
+                }
+                chunk_results = [None] * len(file_chunks)
+                i = n_done
+                for future in as_completed(futures):
+                    chunk_results[futures[future]] = future.result()
+                    i += len(file_chunks[futures[future]])
+                    progress["current-task"] = (
+                        f"Parsing and matching GPX files (parallel): {i}/{total_new}{cache_info}"
+                    )
+                    progress["pct"] = round(pct_start + (i - n_done) / len(batch) * (pct_end - pct_start))
+                batch_results = {}
+                for result in chunk_results:
+                    batch_results.update(result)
+                del chunk_results
+
+            for gpx_file in batch:
+                # unparsable files are stored without segments so they are not parsed again
+                new_results[gpx_file] = batch_results.get(os.path.basename(gpx_file),
+                                                          {"gpx_date": None, "segments": []})
+                if USE_RESULT_CACHE:
+                    store_cached_result(cache_keys[gpx_file], new_results[gpx_file])
+            n_done += len(batch)
+
+            # --- free intermediates before the next batch ---
+            del batch_results
+            gc.collect()
+            rss_mb = psutil.Process().memory_info().rss / 2**20
+            print(f"Matched {n_done}/{total_new} GPX files{batch_info}, RSS {rss_mb:.0f} MB")
+            if MATCH_MEMORY_BUDGET_MB:
+                if rss_mb > MATCH_MEMORY_BUDGET_MB:
+                    batch_size = max(1, batch_size // 2)
+                elif rss_mb < MATCH_MEMORY_BUDGET_MB / 2:
+                    batch_size *= 2
+
+    if USE_RESULT_CACHE and new_files:
+        evict_cache()
+
+    # --- combine new and cached results ---
+    results = {f: new_results[f] if f in new_results else cached_results[f] for f in gpx_files}
+    if not any(result["segments"] for result in results.values()):
+        print("No segments exceeded threshold.")
+        progress["current-task"] = f"No segments exceeded threshold.{cache_info}"
+        progress["pct"] = 100
         return gpd.GeoDataFrame(), gpd.GeoDataFrame()
 
-    joined = joined.reset_index()
-    joined = joined.merge(
-        all_gpx_gdf[["buffer_geom", "gpx_name", "gpx_date"]],
-        left_on="index_right", right_index=True, suffixes=("", "_gpx")
-    )
-
-    # --- intersection lengths ---
-    progress_state["current-task"] = "Calculating intersection lengths"
-    progress_state["pct"] = 75
-    joined["segment_length"] = joined.geometry.length
-    joined["intersection_geom"] = joined.geometry.intersection(joined["buffer_geom"])
-    joined["intersection_length"] = joined["intersection_geom"].length.fillna(0)
-    mask = joined["segment_length"] > 0
-    joined["overlap_percentage"] = 0.0
-    joined.loc[mask, "overlap_percentage"] = (
-        (joined.loc[mask, "intersection_length"] / joined.loc[mask, "segment_length"]).clip(0, 1)
+    progress["current-task"] = "Collecting matched segments"
+    progress["pct"] = 90
+    all_segments = gpd.GeoDataFrame(
+        segments_from_results(bike_network, results).reset_index(drop=True), crs=bike_network.crs
     )
 
-    # --- filter and drop extra columns ---
-    mask = joined["overlap_percentage"] >= intersect_threshold
-    drop_cols = [
-        "index", "index_right", "buffer_geom",
-        "gpx_name_gpx", "gpx_date_gpx",
-        "segment_length", "intersection_geom", "intersection_length"
-    ]
-
-    all_segments = joined.loc[mask].drop(columns=drop_cols, errors="ignore").copy()
-
-    if all_segments.empty:
-        print("No segments exceeded threshold.")
-        print(100)
-        return gpd.GeoDataFrame(), gpd.GeoDataFrame()
-
     # --- matched nodes ---
-    progress_state["current-task"] = "Extracting matched bike nodes"
-    progress_state["pct"] = 90
-    nodes_list = []
-    for (gpx_name, gpx_date), grp in all_segments.groupby(["gpx_name", "gpx_date"]):
-        node_ids = pd.Index(grp["osm_id_from"].tolist() + grp["osm_id_to"].tolist()).dropna().unique().tolist()
-        if not node_ids:
-            continue
-        matched_nodes = point_geodf[point_geodf["osm_id"].isin(node_ids)].copy()
-        if matched_nodes.empty:
-            continue
-        matched_nodes["gpx_name"] = gpx_name
-        matched_nodes["gpx_date"] = gpx_date
-        nodes_list.append(matched_nodes)
-
-    all_nodes = (
-        gpd.GeoDataFrame(pd.concat(nodes_list, ignore_index=True), crs=point_geodf.crs)
-        if nodes_list
-        else gpd.GeoDataFrame(columns=list(point_geodf.columns) + ["gpx_name", "gpx_date"])
-    )
-    progress_state["show-dots"] = False
-    progress_state["current-task"] = "Processing done!"
-    progress_state["pct"] = 100
+    progress["current-task"] = "Extracting matched bike nodes"
+    progress["pct"] = 92
+    all_nodes = extract_matched_nodes(all_segments, point_geodf)
+
+    progress["show-dots"] = False
+    progress["current-task"] = f"Processing done!{cache_info}"
+    progress["pct"] = 100
 
     return all_segments, all_nodes
 
-def create_result_zip(segments_path, nodes_path):
+def create_result_zip(segments_path, nodes_path, zip_folder=STATIC_FOLDER):
     """
-    Zip the two GeoJSON result files and return the zip file path.
+    Zip the two GeoJSON result files into `zip_folder` and return the zip file name.
     """
     zip_name = "matched_results.zip"
-    zip_path = os.path.join(STATIC_FOLDER, zip_name)
+    zip_path = os.path.join(zip_folder, zip_name)
 
     with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
         zf.write(segments_path, arcname="all_matched_segments_wgs84.geojson")
@@ -0,0 +1,262 @@
+from core.common import *
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# --- job parameters ---
+# number of uploads processed at the same time; further jobs wait in the queue
+# (one on Render, where the free tier runs out of memory otherwise, see `use_parallel` in process_gpx_zip)
+JOB_CONCURRENCY = 1 if os.getenv("RENDER") == "true" else 2
+# max. number of queued and running jobs; new jobs are refused above it
+JOB_MAX_PENDING = 10
+# idle jobs (upload, progress and result files) are removed this many seconds after their last run
+JOB_MAX_AGE_S = 3600
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# --- upload parameters ---
+# uploads are streamed to disk in blocks of this many bytes (server memory does not grow with the file)
+UPLOAD_BLOCK_SIZE = 1024**2
+# max. size of an uploaded ZIP in MB (None = no limit)
+UPLOAD_MAX_MB = 2048
+
+# --- upload errors ---
+class UploadOffsetError(ValueError):
+    """A chunk does not start at the bytes received so far; the upload can resume from there."""
+
+class UploadTooLargeError(ValueError):
+    """The upload exceeds `UPLOAD_MAX_MB`; retrying cannot succeed."""
+
+# -- application parameters --
+# job id -> {"progress": dict, "status": "new"/"uploading"/"queued"/"running"/"done"/"failed",
+#            "updated": time of creation or of the end of the last run or upload chunk}
+jobs = {}
+jobs_lock = threading.Lock()
+job_executor = ThreadPoolExecutor(max_workers=JOB_CONCURRENCY, thread_name_prefix="job")
+
+def job_folder(job_id):
+    """
+    Return the folder holding the upload and result files of a job.
+
+    Args:
+        job_id (str): Job id from `create_job`.
+
+    Returns:
+        str: Path of the job folder.
+
+    Raises:
+        ValueError: If `job_id` is not a valid job id (e.g. a tampered browser store).
+    """
+    if not isinstance(job_id, str) or not JOB_ID_PATTERN.match(job_id):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    return os.path.join(JOBS_FOLDER, job_id)
+
+def job_upload_path(job_id):
+    """Return the path of the uploaded ZIP of a job."""
+    return os.path.join(job_folder(job_id), "upload.zip")
+
+def create_job():
+    """
+    Register a new job and create its folder.
+
+    Returns:
+        str: The job id.
+    """
+    cleanup_jobs()
+    job_id = uuid.uuid4().hex
+    os.makedirs(job_folder(job_id), exist_ok=True)
+    with jobs_lock:
+        jobs[job_id] = {"progress": {}, "status": "new", "updated": time.time()}
+    return job_id
+
+def submit_job(job_id, func, *args):
+    """
+    Queue `func(progress, *args)` on the job pool.
+
+    `progress` is the job's own progress dict; it has 'running' set while the
+    job is queued or running and an error message as 'current-task' if `func`
+    raises or the queue is full.
+
+    Args:
+        job_id (str): Job id from `create_job`.
+        func (callable): Processing function.
+        *args: Further arguments of `func`.
+
+    Returns:
+        bool: True if the job was queued, False if it is unknown, already
+        pending, still receiving an upload chunk, or the queue is full.
+    """
+    with jobs_lock:
+        job = jobs.get(job_id)
+        n_pending = sum(j["status"] in ("queued", "running") for j in jobs.values())
+        if job is None or job["status"] in ("queued", "running"):
+            return False
+        if job["status"] == "uploading" or n_pending >= JOB_MAX_PENDING:
+            job["progress"].update({
+                "current-task": (
+                    "The upload is still in progress" if job["status"] == "uploading"
+                    else "Too many uploads are being processed, please try again later"
+                ),
+                "show-dots": False,
+                "btn-disabled": False,
+                "running": False
+            })
+            return False
+        job["status"] = "queued"
+        job["progress"].clear()
+        job["progress"].update({
+            "pct": 0,
+            "btn-disabled": True,
+            "current-task": (
+                f"Waiting for a free worker ({n_pending} jobs ahead)" if n_pending >= JOB_CONCURRENCY
+                else "Starting"
+            ),
+            "show-dots": True,
+            "running": True
+        })
+    job_executor.submit(run_job, job_id, func, args)
+    return True
+
+def run_job(job_id, func, args):
+    """Run a queued job on a pool thread and record how it ended."""
+    job = jobs[job_id]
+    progress = job["progress"]
+    job["status"] = "running"
+    try:
+        func(progress, *args)
+        job["status"] = "done"
+    except Exception as e:
+        print(f"Job {job_id} failed: {e!r}")
+        progress["current-task"] = f"Processing failed: {e}"
+        progress["show-dots"] = False
+        job["status"] = "failed"
+    finally:
+        progress["btn-disabled"] = False
+        progress["running"] = False
+        job["updated"] = time.time()
+
+def upload_max_bytes():
+    """Return the max. size of an upload in bytes, or None without a limit."""
+    return UPLOAD_MAX_MB * 1024**2 if UPLOAD_MAX_MB else None
+
+def append_upload(job_id, stream, offset, length=None):
+    """
+    Append a chunk of an upload to the job's ZIP, reading it in fixed-size blocks.
+
+    Chunks must arrive in order: a chunk is only written if `offset` equals the
+    bytes received so far, so an interrupted upload can resume from the size
+    returned (see `upload_size`). The job is marked as uploading while the
+    chunk is written, so concurrent chunks and `submit_job` are refused.
+
+    Args:
+        job_id (str): Job id from `create_job`.
+        stream (file-like): Request body of the chunk.
+        offset (int): Position of the chunk in the file.
+        length (int, optional): Declared length of the chunk, checked against
+            the size limit before anything is written.
+
+    Returns:
+        int: Bytes of the upload on disk after this chunk.
+
+    Raises:
+        UploadOffsetError: If `offset` does not match the bytes received so far.
+        UploadTooLargeError: If the upload exceeds `UPLOAD_MAX_MB`; the bytes
+            received so far are discarded.
+        ValueError: If the job is unknown, being processed or receiving another chunk.
+    """
+    max_bytes = upload_max_bytes()
+    if max_bytes and length is not None and offset + length > max_bytes:
+        raise UploadTooLargeError(f"Upload exceeds {UPLOAD_MAX_MB} MB")
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None or job["status"] in ("queued", "running"):
+            raise ValueError(f"Job {job_id} does not accept uploads")
+        if job["status"] == "uploading":
+            raise ValueError(f"Job {job_id} is already receiving a chunk")
+        size = upload_size(job_id)
+        if offset != size:
+            raise UploadOffsetError(f"Upload offset {offset} does not match the {size} bytes received")
+        status = job["status"]
+        job["status"] = "uploading"
+
+    try:
+        with open(job_upload_path(job_id), "ab") as f:
+            while block := stream.read(UPLOAD_BLOCK_SIZE):
+                size += len(block)
+                if max_bytes and size > max_bytes:
+                    f.truncate(0)
+                    raise UploadTooLargeError(f"Upload exceeds {UPLOAD_MAX_MB} MB")
+                f.write(block)
+    finally:
+        with jobs_lock:
+            job["status"] = status
+            job["updated"] = time.time()
+    return size
+
+def upload_size(job_id):
+    """Return the bytes of the job's upload received so far."""
+    path = job_upload_path(job_id)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def get_job_progress(job_id):
+    """
+    Return the progress dict of a job.
+
+    Args:
+        job_id (str): Job id from `create_job`.
+
+    Returns:
+        dict or None: Progress state, or None for an unknown or removed job.
+    """
+    with jobs_lock:
+        job = jobs.get(job_id)
+    return job["progress"] if job is not None else None
+
+def progress_version(progress):
+    """
+    Return a fingerprint of everything the app shows of a progress state.
+
+    Pollers compare it with the fingerprint they sent last and skip the update
+    when nothing changed.
+
+    Args:
+        progress (dict): Progress state of a job.
+
+    Returns:
+        str: Fingerprint of the displayed progress fields.
+    """
+    return repr((
+        progress.get("pct"),
+        progress.get("current-task"),
+        progress.get("show-dots"),
+        progress.get("btn-disabled"),
+        progress.get("running"),
+        progress.get("store_data")
+    ))
+
+def cleanup_jobs(max_age_s=JOB_MAX_AGE_S):
+    """
+    Remove jobs idle for more than `max_age_s`, and job folders of unknown jobs.
+
+    Unknown folders are left over from a previous run of the app; they are
+    removed once they are older than `max_age_s` as well.
+    """
+    now = time.time()
+    with jobs_lock:
+        expired = [
+            job_id for job_id, job in jobs.items()
+            if job["status"] not in ("uploading", "queued", "running") and now - job["updated"] > max_age_s
+        ]
+        for job_id in expired:
+            del jobs[job_id]
+        known = set(jobs)
+
+    if not os.path.isdir(JOBS_FOLDER):
+        return
+    for entry in os.scandir(JOBS_FOLDER):
+        if entry.name in known or not entry.is_dir():
+            continue
+        if entry.name in expired or now - entry.stat().st_mtime > max_age_s:
+            shutil.rmtree(entry.path, ignore_errors=True)
@@ -0,0 +1,134 @@
+from core.common import *
+from app.utils import DATA_VERSION_FILE
+import numpy as np
+import shapely
+
+# --- map level parameters ---
+# (max. map zoom, simplification tolerance in meters) per map level, from coarse to
+# detailed: the segment resolution levels plus the preprocessed geometry (tolerance 0)
+MAP_LEVELS = segment_simplify_levels + [(None, 0)]
+NETWORK_LAYER_FOLDER = os.path.join(STATIC_FOLDER, "network")
+
+def map_level(zoom):
+    """
+    Return the map level to show at a map zoom level.
+
+    Args:
+        zoom (int or float): Current map zoom.
+
+    Returns:
+        int: Index into `MAP_LEVELS`.
+    """
+    for level, (max_zoom, _) in enumerate(MAP_LEVELS):
+        if max_zoom is None or zoom <= max_zoom:
+            return level
+    return len(MAP_LEVELS) - 1
+
+def load_map_levels(bike_network):
+    """
+    Take the simplified segment geometries of every map level off the network.
+
+    The levels are written by the preprocessing as extra geometry columns (see
+    `level_geometry_column`); for older network files without them, the
+    geometries are simplified here instead.
+
+    Args:
+        bike_network (GeoDataFrame): Bike network segments in a metric CRS.
+
+    Returns:
+        tuple:
+            GeoDataFrame: The network without the level columns (for matching).
+            list: Per entry of `MAP_LEVELS`, a GeoSeries in WGS84 in network row
+            order and indexed by 'osm_id', or None for the preprocessed geometry itself.
+    """
+    level_geoms = []
+    for _, tolerance in MAP_LEVELS:
+        if tolerance == 0:
+            level_geoms.append(None)
+            continue
+        column = level_geometry_column(tolerance)
+        if column in bike_network.columns:
+            geoms = np.asarray(bike_network[column])
+        else:
+            print(f"Network has no column '{column}', simplifying with {tolerance} m")
+            geoms = shapely.simplify(np.asarray(bike_network.geometry), tolerance, preserve_topology=True)
+        level_geoms.append(
+            gpd.GeoSeries(geoms, index=bike_network["osm_id"].to_numpy(), crs=bike_network.crs).to_crs(epsg=4326)
+        )
+
+    level_columns = [level_geometry_column(tolerance) for _, tolerance in MAP_LEVELS if tolerance > 0]
+    bike_network = bike_network.drop(columns=[c for c in level_columns if c in bike_network.columns])
+    return bike_network, level_geoms
+
+def with_map_level(gdf, level, level_geoms):
+    """
+    Return matched features with the geometry of a map level.
+
+    The level geometries are looked up by network row ('segment_position'), so
+    segments sharing an 'osm_id' keep their own shape.
+
+    Args:
+        gdf (GeoDataFrame): Segments in WGS84 with 'segment_position' and 'osm_id' columns.
+        level (int): Index into `MAP_LEVELS`.
+        level_geoms (list): Level geometries from `load_map_levels`.
+
+    Returns:
+        GeoDataFrame: `gdf` itself at full resolution, otherwise a copy with the
+        simplified geometries (full geometry where the row is unknown or holds
+        another 'osm_id', e.g. for results of an older network).
+    """
+    if level_geoms[level] is None or gdf.empty:
+        return gdf
+    series = level_geoms[level]
+    positions = gdf["segment_position"].to_numpy()
+    known = (positions >= 0) & (positions < len(series))
+    known[known] = series.index.to_numpy()[positions[known]] == gdf["osm_id"].to_numpy()[known]
+    geoms = np.asarray(gdf.geometry).copy()
+    geoms[known] = series.to_numpy()[positions[known]]
+    return gdf.set_geometry(geoms, crs=gdf.crs)
+
+def network_layer_path(level):
+    """
+    Return the FlatGeobuf file of a network layer level for the current data version.
+
+    Args:
+        level (int): Index into `MAP_LEVELS`.
+
+    Returns:
+        str: Path of the layer file.
+    """
+    data_version = DATA_VERSION_FILE.read_text().strip() if DATA_VERSION_FILE.exists() else "unknown"
+    return os.path.join(NETWORK_LAYER_FOLDER, f"network_{data_version}_{level}.fgb")
+
+def build_network_layers(bike_network, level_geoms):
+    """
+    Write the network as one FlatGeobuf file per map level (if missing).
+
+    The files only hold the segment lines in WGS84, without attributes, and are
+    fetched by the map as binary data instead of being embedded in the layout.
+
+    Args:
+        bike_network (GeoDataFrame): Bike network segments in a metric CRS.
+        level_geoms (list): Level geometries from `load_map_levels`.
+    """
+    os.makedirs(NETWORK_LAYER_FOLDER, exist_ok=True)
+    # remove the layers of previous data versions
+    current = {os.path.basename(network_layer_path(level)) for level in range(len(MAP_LEVELS))}
+    for entry in os.scandir(NETWORK_LAYER_FOLDER):
+        if entry.name.startswith("network_") and entry.name not in current:
+            os.remove(entry.path)
+
+    for level, (_, tolerance) in enumerate(MAP_LEVELS):
+        path = network_layer_path(level)
+        if os.path.exists(path):
+            continue
+        if level_geoms[level] is None:
+            geoms = bike_network.geometry.to_crs(epsg=4326).to_numpy()
+        else:
+            geoms = level_geoms[level].to_numpy()
+        layer = gpd.GeoDataFrame(geometry=geoms, crs="EPSG:4326")
+        # write next to the final path so a half-written file is never served
+        tmp_path = path.replace(".fgb", ".tmp.fgb")
+        layer.to_file(tmp_path, driver="FlatGeobuf", engine="pyogrio")
+        os.replace(tmp_path, path)
+        print(f"Network layer level {level} (tolerance {tolerance} m): {os.path.getsize(path) / 1024**2:.2f} MB")
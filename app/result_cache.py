@@ -0,0 +1,109 @@
+from core.common import *
+import json
+import hashlib
+import numpy as np
+import shapely
+
+# --- cache parameters ---
+# bump when the layout of a cache entry changes
+CACHE_FORMAT_VERSION = 2
+# total size of the cache folder before least recently used entries are evicted
+CACHE_MAX_MB = 200
+
+def network_fingerprint(bike_network):
+    """
+    Return a fingerprint of the rows of the bike network.
+
+    Cache entries refer to segments by their row position in the network, so
+    the fingerprint covers the row count and the 'osm_id' and geometry of every
+    row in order. Unlike the data version file, it also changes after a local
+    network refresh. Hashing the whole network takes a moment, so the app
+    computes it once at startup and passes it to `process_gpx_zip`.
+
+    Args:
+        bike_network (GeoDataFrame): GeoDataFrame of bike network segments.
+
+    Returns:
+        str: Hex digest of the network rows.
+    """
+    digest = hashlib.sha256(str(len(bike_network)).encode("utf-8"))
+    digest.update("\n".join(map(str, bike_network["osm_id"])).encode("utf-8"))
+    for wkb in shapely.to_wkb(np.asarray(bike_network.geometry)):
+        digest.update(wkb)
+    return digest.hexdigest()
+
+def gpx_cache_key(gpx_bytes, params, network):
+    """
+    Build a content-addressed cache key for a single GPX file.
+
+    The key covers the raw GPX bytes, the bike network rows and the matching
+    parameters, so any change to one of them results in a miss.
+
+    Args:
+        gpx_bytes (bytes): Raw content of the GPX file.
+        params (dict): Matching parameters, e.g. buffer distance and threshold.
+        network (str): Network fingerprint from `network_fingerprint`.
+
+    Returns:
+        str: Hex digest used as file name of the cache entry.
+    """
+    header = json.dumps(
+        {"format": CACHE_FORMAT_VERSION, "network": network, "params": params},
+        sort_keys=True
+    )
+    digest = hashlib.sha256(header.encode("utf-8"))
+    digest.update(gpx_bytes)
+    return digest.hexdigest()
+
+def load_cached_result(key):
+    """
+    Return the cached result for `key`, or None on a miss.
+
+    A hit refreshes the modification time of the entry, which is used as the
+    recency marker for LRU eviction.
+    """
+    path = os.path.join(CACHE_FOLDER, f"{key}.json")
+    try:
+        with open(path, "r") as f:
+            result = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    os.utime(path)
+    return result
+
+def store_cached_result(key, result):
+    """
+    Write a cache entry atomically.
+
+    Args:
+        key (str): Cache key from `gpx_cache_key`.
+        result (dict): JSON-serializable result with 'gpx_date' (ISO string or None)
+            and 'segments' (list of [network position, overlap percentage]).
+
+    Matched nodes are not stored: they are derived from the matched segments
+    again (see `extract_matched_nodes`), which is cheap compared to matching.
+    """
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    path = os.path.join(CACHE_FOLDER, f"{key}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+def evict_cache(max_mb=CACHE_MAX_MB):
+    """Remove least recently used cache entries until the cache fits in `max_mb`."""
+    if not os.path.isdir(CACHE_FOLDER):
+        return
+    entries = []
+    for entry in os.scandir(CACHE_FOLDER):
+        if entry.is_file() and entry.name.endswith(".json"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    max_bytes = max_mb * 1024**2
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        os.remove(path)
+        total_bytes -= size
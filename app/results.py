@@ -0,0 +1,441 @@
+from core.common import *
+import numpy as np
+import re
+import uuid
+from functools import lru_cache
+
+# --- result storage parameters ---
+# number of processed result sets kept in memory by `load_results`
+RESULTS_MEMORY_SETS = 4
+# number of processed result sets kept on disk before the oldest are removed
+RESULTS_MAX_SETS = 20
+# number of date-filtered aggregates kept in memory by `filter_results`
+FILTERED_MEMORY_SETS = 8
+RESULT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# columns identifying an aggregated segment / node (as grouped in the map and tables)
+SEGMENT_KEYS = ["ref", "osm_id", "osm_id_from", "osm_id_to"]
+NODE_KEYS = ["rcn_ref", "osm_id"]
+# per-segment columns kept with the keys ('segment_position' is the network row, see `with_map_level`)
+SEGMENT_COLUMNS = ["length_km", "segment_position"]
+
+def result_paths(result_id):
+    """
+    Return the Parquet paths of the segments and nodes of a result set.
+
+    Args:
+        result_id (str): Result id from `save_results`.
+
+    Returns:
+        tuple: (segments path, nodes path)
+    """
+    # ids come back from the browser, so never let them address other files
+    if not RESULT_ID_PATTERN.match(str(result_id)):
+        raise ValueError(f"Invalid result id: {result_id!r}")
+    return (
+        os.path.join(RESULTS_FOLDER, f"{result_id}_segments.parquet"),
+        os.path.join(RESULTS_FOLDER, f"{result_id}_nodes.parquet")
+    )
+
+def save_results(all_segments, all_nodes):
+    """
+    Store matched segments and nodes server-side and return their result id.
+
+    Only the id is sent to the browser; callbacks load the data again with
+    `load_results`.
+
+    Args:
+        all_segments (GeoDataFrame): Matched segments with GPX metadata.
+        all_nodes (GeoDataFrame): Matched nodes with GPX metadata.
+
+    Returns:
+        str or None: Result id, or None if nothing was matched.
+    """
+    if all_segments.empty:
+        return None
+
+    os.makedirs(RESULTS_FOLDER, exist_ok=True)
+    result_id = uuid.uuid4().hex
+    segments_path, nodes_path = result_paths(result_id)
+    all_segments.to_parquet(segments_path)
+    all_nodes.to_parquet(nodes_path)
+    evict_results()
+    return result_id
+
+@lru_cache(maxsize=RESULTS_MEMORY_SETS)
+def load_results(result_id):
+    """
+    Load a stored result set as visit indexes (cached in memory for repeated callbacks).
+
+    The returned indexes are shared between callbacks and must not be modified
+    in place.
+
+    Args:
+        result_id (str): Result id from `save_results`.
+
+    Returns:
+        tuple: (segment index, node index) from `build_visit_index`, or
+        (None, None) if the result set no longer exists.
+    """
+    segments_path, nodes_path = result_paths(result_id)
+    if not (os.path.exists(segments_path) and os.path.exists(nodes_path)):
+        return None, None
+    all_segments = gpd.read_parquet(segments_path)
+    all_nodes = gpd.read_parquet(nodes_path)
+    if "segment_position" not in all_segments.columns:
+        # stored before the network rows were kept; shown at full resolution
+        all_segments["segment_position"] = -1
+    return (
+        # a GPX file has a single date: segments count files, nodes count distinct dates
+        build_visit_index(all_segments, SEGMENT_KEYS, SEGMENT_COLUMNS, "gpx_name", ["overlap_percentage"]),
+        build_visit_index(all_nodes, NODE_KEYS, [], "gpx_date", [])
+    )
+
+@lru_cache(maxsize=FILTERED_MEMORY_SETS)
+def filter_results(result_id, start=None, end=None):
+    """
+    Aggregate a stored result set over a date range, formatted for the map and tables.
+
+    The result is cached, so the map, table and highlight callbacks of one date
+    range share a single aggregation. The returned frames must not be modified
+    in place.
+
+    Args:
+        result_id (str): Result id from `save_results`.
+        start (date, optional): First date; defaults to the earliest visit.
+        end (date, optional): Last date; defaults to the latest visit.
+
+    Returns:
+        tuple: (aggregated segments, aggregated nodes) GeoDataFrames with a
+        'tooltip' column, sorted by visit count, or (None, None) if the result
+        set no longer exists.
+    """
+    segment_index, node_index = load_results(result_id)
+    if segment_index is None:
+        return None, None
+
+    # -- Aggregate segments --
+    # groups with missing keys (e.g. missing osm_id_from/to) are kept
+    agg_seg = aggregate_segments(segment_index, start, end)
+
+    # Apply formatting and sort result
+    agg_seg["length_km"] = agg_seg["length_km"].round(2)
+    agg_seg["max_overlap_percentage"] = agg_seg["max_overlap_percentage"].round(2)
+    agg_seg["first_date"] = agg_seg["first_date"].dt.strftime("%Y-%m-%d")
+    agg_seg["last_date"] = agg_seg["last_date"].dt.strftime("%Y-%m-%d")
+    agg_seg = agg_seg.sort_values("count_gpx", ascending=False)
+
+    # Add tooltip
+    agg_seg["tooltip"] = build_tooltips(
+        "Segment ",
+        agg_seg["ref"],
+        {
+            "Visits (GPX)": agg_seg["count_gpx"],
+            "First visit": agg_seg["first_date"],
+            "Last visit": agg_seg["last_date"],
+            "Length (km)": agg_seg["length_km"].map("{:.1f}".format),
+            "Best match (%)": (100 * agg_seg["max_overlap_percentage"]).map("{:.0f}%".format)
+        }
+    )
+
+    # -- Aggregate nodes --
+    agg_nodes = aggregate_nodes(node_index, start, end)
+
+    # Apply formatting and sort result
+    agg_nodes["first_date"] = agg_nodes["first_date"].dt.strftime("%Y-%m-%d")
+    agg_nodes["last_date"] = agg_nodes["last_date"].dt.strftime("%Y-%m-%d")
+    agg_nodes = agg_nodes.sort_values("count_gpx", ascending=False)
+
+    # Add tooltip
+    agg_nodes["tooltip"] = build_tooltips(
+        "Node ",
+        agg_nodes["rcn_ref"],
+        {
+            "Visits (GPX)": agg_nodes["count_gpx"],
+            "First visit": agg_nodes["first_date"],
+            "Last visit": agg_nodes["last_date"]
+        }
+    )
+
+    return agg_seg, agg_nodes
+
+# --- date-indexed result model ---
+def build_visit_index(gdf, keys, feature_columns, unique_by, visit_columns):
+    """
+    Split per-visit rows into unique features and per-feature sorted visit dates.
+
+    Every feature (unique combination of `keys`) is stored once with its
+    geometry. The visits are sorted by feature and date and encoded as one
+    sorted integer key per visit (feature code * day span + day), so the visits
+    of all features in a date range are found with two binary searches.
+
+    Args:
+        gdf (GeoDataFrame): Matched segments or nodes, one row per visit.
+        keys (list): Columns identifying a feature.
+        feature_columns (list): Extra per-feature columns to keep.
+        unique_by (str): Visits with the same feature and `unique_by` value are
+            counted once (e.g. 'gpx_name' or 'gpx_date'), with the maximum of
+            their `visit_columns`.
+        visit_columns (list): Numeric per-visit columns to keep.
+
+    Returns:
+        dict: 'features' (GeoDataFrame in key order), 'keys' (sorted visit keys),
+        'days' (visit dates as days since the epoch), 'first_day', 'day_span'
+        and one array per column of `visit_columns`, all in key order.
+    """
+    # codes follow the sorted key order of a groupby with missing keys last
+    codes = gdf.groupby(keys, dropna=False, sort=True).ngroup().to_numpy()
+    _, first_rows = np.unique(codes, return_index=True)
+    features = gpd.GeoDataFrame(
+        gdf.iloc[first_rows][keys + feature_columns + [gdf.geometry.name]].reset_index(drop=True),
+        geometry=gdf.geometry.name,
+        crs=gdf.crs
+    )
+
+    days = pd.to_datetime(gdf["gpx_date"]).to_numpy().astype("datetime64[D]").astype(np.int64)
+    visits = pd.DataFrame({"feature": codes, "day": days, "unique_by": gdf[unique_by].to_numpy()})
+    for column in visit_columns:
+        visits[column] = gdf[column].to_numpy()
+    # a duplicate visit keeps the maximum of every visit column, as `range_max` does over a date range
+    visits = (
+        visits.groupby(["feature", "unique_by"], dropna=False, sort=False)
+        .agg({"day": "min", **{column: "max" for column in visit_columns}})
+        .reset_index()
+        .sort_values(["feature", "day"], kind="stable")
+    )
+
+    first_day = int(visits["day"].min()) if len(visits) else 0
+    day_span = int(visits["day"].max()) - first_day + 1 if len(visits) else 1
+    index = {
+        "features": features,
+        "keys": visits["feature"].to_numpy() * day_span + (visits["day"].to_numpy() - first_day),
+        "days": visits["day"].to_numpy(),
+        "first_day": first_day,
+        "day_span": day_span
+    }
+    for column in visit_columns:
+        index[column] = visits[column].to_numpy()
+    return index
+
+def visit_ranges(index, start=None, end=None):
+    """
+    Locate the visits of every feature between `start` and `end` (inclusive).
+
+    Args:
+        index (dict): Visit index from `build_visit_index`.
+        start (date, optional): First date; defaults to the earliest visit.
+        end (date, optional): Last date; defaults to the latest visit.
+
+    Returns:
+        tuple: (features, lo, hi) arrays: the codes of the features with visits
+        in the range and their visits as slices `lo:hi` of the index arrays.
+    """
+    day_span = index["day_span"]
+    # offsets are clipped to the span so a key never reaches a neighbouring feature
+    start_offset = 0 if start is None else np.datetime64(start, "D").astype(np.int64) - index["first_day"]
+    end_offset = day_span - 1 if end is None else np.datetime64(end, "D").astype(np.int64) - index["first_day"]
+    start_offset = min(max(start_offset, 0), day_span)
+    end_offset = min(max(end_offset, -1), day_span - 1)
+
+    base = np.arange(len(index["features"])) * day_span
+    lo = np.searchsorted(index["keys"], base + start_offset, side="left")
+    hi = np.searchsorted(index["keys"], base + end_offset, side="right")
+    features = np.flatnonzero(hi > lo)
+    return features, lo[features], hi[features]
+
+def range_max(values, lo, hi):
+    """
+    Return the maximum of `values[lo:hi]` for every (non-empty) slice in one call.
+
+    Args:
+        values (np.ndarray): Values in index order.
+        lo (np.ndarray): Slice starts (ascending).
+        hi (np.ndarray): Slice ends, with `lo < hi <= next lo`.
+
+    Returns:
+        np.ndarray: Maximum per slice.
+    """
+    if len(lo) == 0:
+        return values[:0]
+    # reduce over [lo_i, hi_i) and drop the gaps [hi_i, lo_i+1); the appended
+    # element keeps a final hi == len(values) a valid reduceat index
+    bounds = np.column_stack([lo, hi]).ravel()
+    return np.maximum.reduceat(np.append(values, values[0]), bounds)[::2]
+
+def aggregate_segments(index, start=None, end=None):
+    """
+    Aggregate the segment visits in a date range per segment.
+
+    Args:
+        index (dict): Segment visit index from `build_visit_index`.
+        start (date, optional): First date; defaults to the earliest visit.
+        end (date, optional): Last date; defaults to the latest visit.
+
+    Returns:
+        GeoDataFrame: One row per visited segment with 'length_km', 'count_gpx',
+        'max_overlap_percentage', 'first_date' and 'last_date' (datetime64),
+        in key order.
+    """
+    features, lo, hi = visit_ranges(index, start, end)
+    stats = pd.DataFrame(
+        {
+            "count_gpx": hi - lo,
+            "max_overlap_percentage": range_max(index["overlap_percentage"], lo, hi),
+            "first_date": index["days"][lo].astype("datetime64[D]"),
+            "last_date": index["days"][hi - 1].astype("datetime64[D]")
+        },
+        index=features
+    )
+    return features_with_stats(index, stats)
+
+def aggregate_nodes(index, start=None, end=None):
+    """
+    Aggregate the node visits in a date range per node.
+
+    Args:
+        index (dict): Node visit index from `build_visit_index`.
+        start (date, optional): First date; defaults to the earliest visit.
+        end (date, optional): Last date; defaults to the latest visit.
+
+    Returns:
+        GeoDataFrame: One row per visited node with 'count_gpx' (number of
+        distinct dates), 'first_date' and 'last_date' (datetime64), in key order.
+    """
+    features, lo, hi = visit_ranges(index, start, end)
+    stats = pd.DataFrame(
+        {
+            "count_gpx": hi - lo,
+            "first_date": index["days"][lo].astype("datetime64[D]"),
+            "last_date": index["days"][hi - 1].astype("datetime64[D]")
+        },
+        index=features
+    )
+    return features_with_stats(index, stats)
+
+def features_with_stats(index, stats):
+    """
+    Attach aggregated statistics to their features (geometry as last column).
+
+    Args:
+        index (dict): Visit index from `build_visit_index`.
+        stats (DataFrame): Statistics indexed by feature code.
+
+    Returns:
+        GeoDataFrame: The features in `stats`, in feature code order.
+    """
+    # geometries are only looked up for the features that survive the filter
+    features = index["features"].iloc[stats.index].reset_index(drop=True)
+    geometry_name = features.geometry.name
+    features = features.assign(**{column: stats[column].to_numpy() for column in stats.columns})
+    columns = [c for c in features.columns if c != geometry_name] + [geometry_name]
+    return features[columns]
+
+# --- highlight lookups ---
+@lru_cache(maxsize=FILTERED_MEMORY_SETS)
+def highlight_index(result_id, start=None, end=None):
+    """
+    Build the id lookups used to highlight table selections on the map.
+
+    The segment features of a filtered result are serialized once; table rows
+    are resolved to segment positions through the lookups, so a selection only
+    needs the selected row indices.
+
+    Args:
+        result_id (str): Result id from `save_results`.
+        start (date, optional): First date (see `filter_results`).
+        end (date, optional): Last date (see `filter_results`).
+
+    Returns:
+        dict or None: Highlight index, or None if the result set no longer exists:
+            - 'features': GeoJSON feature per aggregated segment (table order)
+            - 'bounds': (n, 4) array of segment bounds
+            - 'segment_ids' / 'node_ids': 'osm_id' per row of the segment / node table
+            - 'by_segment': segment 'osm_id' -> segment positions
+            - 'by_node': node 'osm_id' -> positions of the segments ending in it
+    """
+    agg_seg, agg_nodes = filter_results(result_id, start, end)
+    if agg_seg is None:
+        return None
+
+    positions = np.arange(len(agg_seg))
+    node_keys = np.concatenate([agg_seg["osm_id_from"].to_numpy(), agg_seg["osm_id_to"].to_numpy()])
+    by_node = pd.Series(np.concatenate([positions, positions])).groupby(node_keys).indices
+
+    return {
+        "features": agg_seg.__geo_interface__["features"],
+        "bounds": agg_seg.geometry.bounds.to_numpy(),
+        "segment_ids": agg_seg["osm_id"].to_numpy(),
+        "node_ids": agg_nodes["osm_id"].to_numpy(),
+        "by_segment": agg_seg.groupby("osm_id").indices,
+        # `indices` holds positions in the concatenated from/to keys
+        "by_node": {node: np.unique(idx % len(agg_seg)) for node, idx in by_node.items()},
+    }
+
+def highlight_features(index, lookup, ids):
+    """
+    Collect the pre-serialized segment features of a set of ids.
+
+    Args:
+        index (dict): Highlight index from `highlight_index`.
+        lookup (str): 'by_segment' or 'by_node'.
+        ids (iterable): Segment or node 'osm_id' values.
+
+    Returns:
+        dict or None: GeoJSON FeatureCollection in table order, or None if no
+        segment matches.
+    """
+    matches = [index[lookup][i] for i in ids if i in index[lookup]]
+    if not matches:
+        return None
+    positions = np.unique(np.concatenate(matches))
+    bounds = index["bounds"][positions]
+    return {
+        "type": "FeatureCollection",
+        "features": [index["features"][p] for p in positions],
+        "bbox": (*bounds[:, :2].min(axis=0), *bounds[:, 2:].max(axis=0)),
+    }
+
+# --- tooltips ---
+def build_tooltips(label_prefix, label_values, kpis):
+    """
+    Build the HTML map tooltips of many features at once.
+
+    The strings are assembled with column-wise string concatenation instead of
+    formatting every row separately.
+
+    Args:
+        label_prefix (str): Text in front of the feature label, e.g. "Segment ".
+        label_values (Series): Feature label per row.
+        kpis (dict): KPI name -> Series of formatted values (same index).
+
+    Returns:
+        Series: HTML tooltip per row.
+    """
+    # first line: prefix in light grey, value in black and larger font, plus a blank line
+    tooltips = (
+        f'<span style="color: #999; font-size: 14px;">{label_prefix}</span>'
+        '<span style="color: #000; font-size: 16px; font-weight: bold;">'
+        + label_values.astype(str)
+        + '</span><br>'
+    )
+    # KPI lines in smaller font
+    for kpi_name, kpi_values in kpis.items():
+        tooltips = (
+            tooltips
+            + f'<br><span style="color: #999; font-size: 11px;">{kpi_name}: </span>'
+            '<b style="color: #000; font-size: 11px;">'
+            + kpi_values.astype(str)
+            + '</b>'
+        )
+    return tooltips
+
+def evict_results(max_sets=RESULTS_MAX_SETS):
+    """Remove the oldest stored result sets until at most `max_sets` remain."""
+    segment_files = sorted(
+        (entry.stat().st_mtime, entry.name.removesuffix("_segments.parquet"))
+        for entry in os.scandir(RESULTS_FOLDER)
+        if entry.is_file() and entry.name.endswith("_segments.parquet")
+    )
+    for _, result_id in segment_files[:max(0, len(segment_files) - max_sets)]:
+        for path in result_paths(result_id):
+            if os.path.exists(path):
+                os.remove(path)
@@ -5,10 +5,22 @@ import os
 
 # ---------- Constants ----------
 # files and folders
-UPLOAD_FOLDER = "app/uploads"
 STATIC_FOLDER = "app/static"
+CACHE_FOLDER = "app/cache"
+RESULTS_FOLDER = "app/results"
+JOBS_FOLDER = "app/jobs"
 
 # geoprocessing
-multiline_geojson = 'data/processed/gdf_multiline.geojson'
 multiline_parquet_proj = 'data/processed/gdf_multiline_projected.parquet'
 point_parquet_proj = 'data/processed/gdf_point_projected.parquet'
+
+# map resolution levels of the segment geometries: (max. map zoom, simplification tolerance in m),
+# from coarse to detailed; stored as extra geometry columns (see `level_geometry_column`)
+segment_simplify_levels = [(9, 150), (12, 30)]
+
+def level_geometry_column(tolerance):
+    """Return the name of the geometry column simplified with `tolerance` meters."""
+    return f"geometry_{tolerance}m"
+
+# column with a hash of the raw segment / node geometry (compared by the incremental network refresh)
+geometry_hash_column = "geom_hash"
@@ -0,0 +1,457 @@
+"""
+Micro-benchmarks for the GPX processing pipeline.
+
+Usage (from the repository root):
+    python -m scripts.benchmarks gpx_parsing node_extraction match_engines tooltips osm_enrichment tag_parsing
+"""
+import os
+import io
+import re
+import argparse
+import contextlib
+import tempfile
+import timeit
+import datetime
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from lxml import etree
+from shapely.geometry import LineString, MultiLineString
+import app.geoprocessing as geoprocessing
+from app.geoprocessing import parse_single_gpx, extract_matched_nodes
+from app.results import build_tooltips
+from scripts.geofabrik_processing import enrich_with_osm_ids, explode_tags
+
+def make_synthetic_gpx(n_points, n_segments=1, seed=0):
+    """
+    Build a GPX 1.1 document with a random walk track around Brussels.
+
+    Args:
+        n_points (int): Total number of trackpoints.
+        n_segments (int, optional): Number of track segments. Defaults to 1.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        bytes: UTF-8 encoded GPX document.
+    """
+    rng = np.random.default_rng(seed)
+    lat = 50.85 + np.cumsum(rng.normal(0, 2e-5, n_points))
+    lon = 4.35 + np.cumsum(rng.normal(0, 3e-5, n_points))
+    segments = []
+    for idx in np.array_split(np.arange(n_points), n_segments):
+        pts = "".join(
+            f'<trkpt lat="{lat[i]:.7f}" lon="{lon[i]:.7f}"><ele>20.0</ele>'
+            f'<time>2024-05-01T10:{(i // 60) % 60:02d}:{i % 60:02d}Z</time></trkpt>'
+            for i in idx
+        )
+        segments.append(f"<trkseg>{pts}</trkseg>")
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="benchmark" xmlns="http://www.topografix.com/GPX/1/1">'
+        f'<trk><name>synthetic</name><type>cycling</type>{"".join(segments)}</trk></gpx>'
+    ).encode("utf-8")
+
+def _parse_single_gpx_tuples(gpx_file, zip_folder):
+    """Reference implementation: per-point Python tuples (as before vectorization)."""
+    root = etree.parse(os.path.join(zip_folder, gpx_file)).getroot()
+    ns = {"gpx": "http://www.topografix.com/GPX/1/1"}
+    line_segments = []
+    for seg in root.findall(".//gpx:trk/gpx:trkseg", namespaces=ns):
+        pts = [(float(p.attrib["lon"]), float(p.attrib["lat"]))
+               for p in seg.findall("gpx:trkpt", namespaces=ns)]
+        if len(pts) > 1:
+            line_segments.append(LineString(pts))
+    return MultiLineString(line_segments) if len(line_segments) > 1 else line_segments[0]
+
+def bench_gpx_parsing(n_points=100_000, n_segments=3, repeats=5):
+    """
+    Compare tuple-based and vectorized coordinate extraction on one large ride.
+
+    Both paths parse the same XML tree, which takes a large share of the
+    time, so the end-to-end gain is modest and machine dependent (about
+    x1.1-x1.7 on the default input). The coordinate extraction on its own
+    (parse time subtracted) gains more.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, "ride.gpx"), "wb") as f:
+            f.write(make_synthetic_gpx(n_points, n_segments))
+
+        # both paths must produce the same geometry
+        reference = _parse_single_gpx_tuples("ride.gpx", tmp_dir)
+        vectorized = parse_single_gpx("ride.gpx", tmp_dir)["geometry"]
+        assert reference.equals_exact(vectorized, 0), "geometries differ"
+
+        # keep the garbage collector enabled: per-point objects are part of the real cost
+        t_tuples = min(timeit.repeat(lambda: _parse_single_gpx_tuples("ride.gpx", tmp_dir),
+                                     setup="gc.enable()", number=1, repeat=repeats))
+        t_vector = min(timeit.repeat(lambda: parse_single_gpx("ride.gpx", tmp_dir),
+                                     setup="gc.enable()", number=1, repeat=repeats))
+        # XML parsing shared by both paths
+        t_parse = min(timeit.repeat(lambda: etree.parse(os.path.join(tmp_dir, "ride.gpx")),
+                                    setup="gc.enable()", number=1, repeat=repeats))
+
+    print(f"GPX parsing ({n_points} points, {n_segments} segments, best of {repeats})")
+    print(f"  XML parse:  {t_parse * 1000:8.1f} ms  (shared by both paths)")
+    print(f"  tuples:     {t_tuples * 1000:8.1f} ms")
+    print(f"  vectorized: {t_vector * 1000:8.1f} ms  (x{t_tuples / t_vector:.1f} end to end, "
+          f"x{(t_tuples - t_parse) / max(t_vector - t_parse, 1e-9):.1f} excluding the XML parse)")
+
+def make_synthetic_matches(n_rides, segments_per_ride, n_nodes, seed=0):
+    """
+    Build matched segments and a node table shaped like the pipeline outputs.
+
+    Returns:
+        tuple: (all_segments DataFrame, point_geodf GeoDataFrame)
+    """
+    rng = np.random.default_rng(seed)
+    node_ids = np.array([str(100000 + i) for i in range(n_nodes)], dtype=object)
+    point_geodf = gpd.GeoDataFrame(
+        {
+            "osm_id": node_ids,
+            "rcn_ref": [str(i % 100) for i in range(n_nodes)],
+            "name": None,
+        },
+        geometry=shapely.points(rng.uniform(540000, 800000, (n_nodes, 2))),
+        crs="EPSG:3812"
+    )
+
+    n_rows = n_rides * segments_per_ride
+    ride = np.repeat(np.arange(n_rides), segments_per_ride)
+    osm_id_to = node_ids[rng.integers(0, n_nodes, n_rows)]
+    osm_id_to[rng.random(n_rows) < 0.02] = None  # partially matched segments
+    all_segments = pd.DataFrame({
+        "gpx_name": [f"ride_{r:05d}.gpx" for r in ride],
+        "gpx_date": [datetime.date(2015, 1, 1) + datetime.timedelta(days=int(r)) for r in ride],
+        "osm_id_from": node_ids[rng.integers(0, n_nodes, n_rows)],
+        "osm_id_to": osm_id_to,
+    })
+    return all_segments, point_geodf
+
+def _extract_matched_nodes_loop(all_segments, point_geodf):
+    """Reference implementation: one `isin` scan of all nodes per GPX track."""
+    nodes_list = []
+    for (gpx_name, gpx_date), grp in all_segments.groupby(["gpx_name", "gpx_date"]):
+        node_ids = pd.Index(grp["osm_id_from"].tolist() + grp["osm_id_to"].tolist()).dropna().unique().tolist()
+        if not node_ids:
+            continue
+        matched_nodes = point_geodf[point_geodf["osm_id"].isin(node_ids)].copy()
+        if matched_nodes.empty:
+            continue
+        matched_nodes["gpx_name"] = gpx_name
+        matched_nodes["gpx_date"] = gpx_date
+        nodes_list.append(matched_nodes)
+    return gpd.GeoDataFrame(pd.concat(nodes_list, ignore_index=True), crs=point_geodf.crs)
+
+def bench_node_extraction(n_rides=3000, segments_per_ride=40, n_nodes=8000, repeats=3):
+    """Compare the per-track node lookup loop with the single melt + merge."""
+    all_segments, point_geodf = make_synthetic_matches(n_rides, segments_per_ride, n_nodes)
+
+    # the vectorized join must reproduce the loop output exactly
+    reference = _extract_matched_nodes_loop(all_segments, point_geodf)
+    vectorized = extract_matched_nodes(all_segments, point_geodf)
+    pd.testing.assert_frame_equal(reference, vectorized)
+
+    t_loop = min(timeit.repeat(lambda: _extract_matched_nodes_loop(all_segments, point_geodf),
+                               setup="gc.enable()", number=1, repeat=repeats))
+    t_join = min(timeit.repeat(lambda: extract_matched_nodes(all_segments, point_geodf),
+                               setup="gc.enable()", number=1, repeat=repeats))
+
+    print(f"Node extraction ({n_rides} rides x {segments_per_ride} segments, {n_nodes} nodes, best of {repeats})")
+    print(f"  per-ride loop:  {t_loop * 1000:8.1f} ms")
+    print(f"  melt + merge:   {t_join * 1000:8.1f} ms  (x{t_loop / t_join:.1f})")
+
+def make_synthetic_network_and_tracks(n_segments=2000, n_tracks=300, legs_per_track=6, seed=0):
+    """
+    Build a random network and tracks that partially follow it (EPSG:3812).
+
+    Each track is a MultiLineString with one part per leg. A leg follows a
+    random stretch of a random segment with GPS-like noise, and some legs are
+    offset sideways to create overlaps around the buffer distance.
+
+    Returns:
+        tuple: (bike_network GeoDataFrame, track geometries as np.ndarray)
+    """
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform([600000, 640000], [640000, 680000], (n_segments, 2))
+    steps = rng.normal(0, 120, (n_segments, 10, 2)) + rng.normal(0, 80, (n_segments, 1, 2))
+    coords = starts[:, None, :] + np.cumsum(steps, axis=1)
+    segments = shapely.linestrings(coords)
+    bike_network = gpd.GeoDataFrame(
+        {"osm_id": [str(i) for i in range(n_segments)]},
+        geometry=shapely.multilinestrings(segments[:, None].tolist()),
+        crs="EPSG:3812"
+    )
+
+    tracks = []
+    for _ in range(n_tracks):
+        legs = []
+        for segment in segments[rng.integers(0, n_segments, legs_per_track)]:
+            start, end = np.sort(rng.uniform(0, 1, 2))
+            distances = np.arange(start, end, 5 / segment.length) * segment.length
+            if len(distances) < 2:
+                continue
+            pts = shapely.get_coordinates(shapely.line_interpolate_point(segment, distances))
+            offset = rng.choice([0, 0, 10, 18, 25])
+            pts = pts + rng.normal(0, 3, pts.shape) + offset
+            legs.append(pts)
+        tracks.append(shapely.multilinestrings([shapely.linestrings(leg) for leg in legs]))
+    return bike_network, np.array(tracks, dtype=object)
+
+def bench_match_engines(n_segments=2000, n_tracks=100, repeats=3):
+    """Compare accuracy and speed of the buffer and distance matching engines."""
+    bike_network, track_geoms = make_synthetic_network_and_tracks(n_segments, n_tracks)
+    threshold = geoprocessing.intersect_threshold
+
+    results = {}
+    for engine, overlap_func in (("buffer", geoprocessing.overlap_by_buffer),
+                                 ("distance", geoprocessing.overlap_by_distance)):
+        # the first call also builds the network index / sample points, which happens once at startup
+        track_idx, segment_idx, overlap = overlap_func(track_geoms, bike_network)
+        elapsed = min(timeit.repeat(lambda: overlap_func(track_geoms, bike_network),
+                                    setup="gc.enable()", number=1, repeat=repeats))
+        results[engine] = (pd.Series(overlap, index=pd.MultiIndex.from_arrays([segment_idx, track_idx])), elapsed)
+
+    buffer_overlap, t_buffer = results["buffer"]
+    distance_overlap, t_distance = results["distance"]
+    both = buffer_overlap.to_frame("buffer").join(distance_overlap.to_frame("distance"), how="outer").fillna(0)
+    matched_buffer = both["buffer"] >= threshold
+    matched_distance = both["distance"] >= threshold
+    abs_diff = (both["buffer"] - both["distance"]).abs()
+
+    print(f"Match engines ({n_segments} segments, {n_tracks} tracks, threshold {threshold}, best of {repeats})")
+    print(f"  buffer:   {t_buffer * 1000:8.1f} ms, {matched_buffer.sum()} matched pairs")
+    print(f"  distance: {t_distance * 1000:8.1f} ms, {matched_distance.sum()} matched pairs (x{t_buffer / t_distance:.1f})")
+    print(f"  agreement on matched pairs: {(matched_buffer & matched_distance).sum() / (matched_buffer | matched_distance).sum():.4f}")
+    print(f"  overlap difference: mean {abs_diff.mean():.4f}, max {abs_diff.max():.4f}, "
+          f"> 0.05 for {(abs_diff > 0.05).sum()} of {len(both)} candidate pairs")
+
+def make_synthetic_segment_aggregate(n_rows, seed=0):
+    """Build a formatted segment aggregate shaped like the one in `filter_data`."""
+    rng = np.random.default_rng(seed)
+    first = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3000, n_rows), unit="D")
+    ref = pd.Series([f"{rng.integers(1, 99)}-{rng.integers(1, 99)}" for _ in range(n_rows)], dtype=object)
+    ref[rng.random(n_rows) < 0.01] = None
+    return pd.DataFrame({
+        "ref": ref,
+        "count_gpx": rng.integers(1, 200, n_rows),
+        "first_date": first.strftime("%Y-%m-%d"),
+        "last_date": (first + pd.to_timedelta(rng.integers(0, 1000, n_rows), unit="D")).strftime("%Y-%m-%d"),
+        "length_km": rng.uniform(0.1, 8, n_rows).round(2),
+        "max_overlap_percentage": rng.uniform(0.75, 1, n_rows).round(2),
+    })
+
+def _segment_tooltips_apply(agg_seg):
+    """Reference implementation: one formatted tooltip per row via `apply(axis=1)`."""
+    def build_tooltip(label_prefix, label_value, kpi_dict):
+        tooltip_lines = [
+            f'<span style="color: #999; font-size: 14px;">{label_prefix}</span>'
+            f'<span style="color: #000; font-size: 16px; font-weight: bold;">{label_value}</span>'
+            '<br>'
+        ]
+        for kpi_name, kpi_value in kpi_dict.items():
+            tooltip_lines.append(
+                f'<span style="color: #999; font-size: 11px;">{kpi_name}: </span>'
+                f'<b style="color: #000; font-size: 11px;">{kpi_value}</b>'
+            )
+        return "<br>".join(tooltip_lines)
+
+    return agg_seg.apply(
+        lambda row: build_tooltip(
+            "Segment ",
+            row["ref"],
+            {
+                "Visits (GPX)": row["count_gpx"],
+                "First visit": row["first_date"],
+                "Last visit": row["last_date"],
+                "Length (km)": f'{row["length_km"]:.1f}',
+                "Best match (%)": f'{100*row["max_overlap_percentage"]:.0f}%'
+            }
+        ),
+        axis=1
+    )
+
+def _segment_tooltips_vectorized(agg_seg):
+    """Tooltips as built in `filter_data`."""
+    return build_tooltips(
+        "Segment ",
+        agg_seg["ref"],
+        {
+            "Visits (GPX)": agg_seg["count_gpx"],
+            "First visit": agg_seg["first_date"],
+            "Last visit": agg_seg["last_date"],
+            "Length (km)": agg_seg["length_km"].map("{:.1f}".format),
+            "Best match (%)": (100 * agg_seg["max_overlap_percentage"]).map("{:.0f}%".format)
+        }
+    )
+
+def bench_tooltips(n_rows=10_000, repeats=5):
+    """Compare row-wise and column-wise tooltip generation on a segment aggregate."""
+    agg_seg = make_synthetic_segment_aggregate(n_rows)
+
+    # both paths must produce the same HTML
+    pd.testing.assert_series_equal(_segment_tooltips_apply(agg_seg), _segment_tooltips_vectorized(agg_seg))
+
+    t_apply = min(timeit.repeat(lambda: _segment_tooltips_apply(agg_seg),
+                                setup="gc.enable()", number=1, repeat=repeats))
+    t_vector = min(timeit.repeat(lambda: _segment_tooltips_vectorized(agg_seg),
+                                 setup="gc.enable()", number=1, repeat=repeats))
+
+    print(f"Tooltips ({n_rows} aggregated segments, best of {repeats})")
+    print(f"  apply(axis=1): {t_apply * 1000:8.1f} ms")
+    print(f"  vectorized:    {t_vector * 1000:8.1f} ms  (x{t_apply / t_vector:.1f})")
+
+def make_synthetic_segments_and_nodes(n_segments=3000, n_refs=100, seed=0):
+    """
+    Build segments with a "from-to" 'ref' and nodes shaped like the preprocessing inputs (EPSG:3812).
+
+    Every segment end gets a node with its node number, some ends get a second
+    node with the same number (duplicate osm_id candidates) and some get none.
+    Decoy nodes with other numbers are placed along the segments.
+
+    Returns:
+        tuple: (gdf_multiline GeoDataFrame, gdf_point GeoDataFrame)
+    """
+    bike_network, _ = make_synthetic_network_and_tracks(n_segments, n_tracks=0, seed=seed)
+    rng = np.random.default_rng(seed)
+    refs = rng.integers(1, n_refs, (n_segments, 2))
+    gdf_multiline = bike_network.assign(ref=[f"{a}-{b}" for a, b in refs])
+
+    lines = shapely.get_geometry(np.asarray(gdf_multiline.geometry), 0)
+    ends = np.concatenate([shapely.get_point(lines, 0), shapely.get_point(lines, -1)])
+    end_refs = np.concatenate([refs[:, 0], refs[:, 1]])
+    keep = rng.random(len(ends)) > 0.02  # segment ends without a node
+    duplicate = rng.random(len(ends)) < 0.1
+    decoys = shapely.line_interpolate_point(lines, 0.5, normalized=True)
+    geoms = np.concatenate([ends[keep], ends[duplicate], decoys])
+    node_refs = np.concatenate([end_refs[keep], end_refs[duplicate], rng.integers(1, n_refs, len(decoys))])
+    gdf_point = gpd.GeoDataFrame(
+        {
+            "osm_id": [str(100000 + i) for i in rng.permutation(len(geoms))],
+            "rcn_ref": [str(r) for r in node_refs],
+        },
+        geometry=geoms,
+        crs="EPSG:3812"
+    )
+    return gdf_multiline, gdf_point
+
+def _enrich_with_osm_ids_loop(gdf_multiline, gdf_point, max_dist=20.0, node_width=3):
+    """Reference implementation: buffer and scan all nodes per segment (as before vectorization)."""
+    gdf_multiline = gdf_multiline.copy()
+    gdf_point = gdf_point.copy()
+    gdf_multiline['node_from'] = gdf_multiline['ref'].str.split('-', expand=True)[0].astype(str).str.zfill(node_width)
+    gdf_multiline['node_to'] = gdf_multiline['ref'].str.split('-', expand=True)[1].astype(str).str.zfill(node_width)
+    gdf_point['rcn_ref_join'] = gdf_point['rcn_ref'].astype(str).str.zfill(node_width)
+
+    osm_from_list, osm_to_list = [], []
+    for _, seg in gdf_multiline.iterrows():
+        buffer_geom = seg.geometry.buffer(max_dist)
+        for node, osm_list in ((seg['node_from'], osm_from_list), (seg['node_to'], osm_to_list)):
+            candidates = gdf_point[gdf_point['rcn_ref_join'] == node]
+            candidates = candidates[candidates.intersects(buffer_geom)]
+            osm_list.append(candidates['osm_id'].min() if not candidates.empty else None)
+    gdf_multiline['osm_id_from'] = osm_from_list
+    gdf_multiline['osm_id_to'] = osm_to_list
+
+    def match_flag(row):
+        if pd.notna(row['osm_id_from']) and pd.notna(row['osm_id_to']):
+            return 'full'
+        elif pd.isna(row['osm_id_from']) and pd.isna(row['osm_id_to']):
+            return 'none'
+        else:
+            return 'partial'
+
+    gdf_multiline['osm_match_flag'] = gdf_multiline.apply(match_flag, axis=1)
+    return gdf_multiline, gdf_point
+
+def bench_osm_enrichment(n_segments=3000, repeats=3):
+    """Compare the per-segment node lookup loop with the bulk spatial index join."""
+    gdf_multiline, gdf_point = make_synthetic_segments_and_nodes(n_segments)
+    quiet = {"disable": True}
+
+    # the bulk join must reproduce the loop output exactly (summary printout suppressed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        reference, _ = _enrich_with_osm_ids_loop(gdf_multiline, gdf_point)
+        vectorized, _ = enrich_with_osm_ids(gdf_multiline, gdf_point, tqdm_params=quiet)
+        pd.testing.assert_frame_equal(reference, vectorized)
+
+        t_loop = min(timeit.repeat(lambda: _enrich_with_osm_ids_loop(gdf_multiline, gdf_point),
+                                   setup="gc.enable()", number=1, repeat=repeats))
+        t_join = min(timeit.repeat(lambda: enrich_with_osm_ids(gdf_multiline, gdf_point, tqdm_params=quiet),
+                                   setup="gc.enable()", number=1, repeat=repeats))
+
+    print(f"OSM id enrichment ({n_segments} segments, {len(gdf_point)} nodes, best of {repeats})")
+    print(f"  per-segment loop: {t_loop * 1000:8.1f} ms")
+    print(f"  bulk index join:  {t_join * 1000:8.1f} ms  (x{t_loop / t_join:.1f})")
+
+def make_synthetic_tags(n_rows, seed=0):
+    """
+    Build an OSM 'other_tags' column of route nodes as written by the GDAL OSM driver.
+
+    Rows carry 2-5 tags from a fixed set (some with colons in the key) in varying
+    order; a few rows have no tags.
+
+    Returns:
+        DataFrame: 'osm_id' and 'other_tags' columns.
+    """
+    rng = np.random.default_rng(seed)
+    keys = ["network:type", "rcn_ref", "rwn_ref", "expected_rcn_route_relations", "note", "name", "tourism"]
+    n_tags = rng.integers(2, 6, n_rows)
+    order = np.argsort(rng.random((n_rows, len(keys))), axis=1)
+    values = rng.integers(1, 100, (n_rows, len(keys)))
+    other_tags = [
+        ",".join(f'"{keys[k]}"=>"{values[i, k]}"' for k in order[i, :n_tags[i]])
+        for i in range(n_rows)
+    ]
+    other_tags = pd.Series(other_tags, dtype=object)
+    other_tags[rng.random(n_rows) < 0.01] = None
+    return pd.DataFrame({"osm_id": np.arange(n_rows).astype(str), "other_tags": other_tags})
+
+def _explode_tags_regex(df, tags_column, tags_to_keep=None):
+    """Reference implementation: regex + dicts per row and `json_normalize` (as before)."""
+    def parse(tag_string):
+        tag_dict = {k.replace(':', '_'): v for k, v in dict(re.findall(r'"(.*?)"=>"(.*?)"', tag_string)).items()}
+        if not tags_to_keep:
+            return tag_dict
+        return {k: v for k, v in tag_dict.items() if k in tags_to_keep}
+
+    exploded_tags = df[tags_column].apply(lambda x: parse(x) if isinstance(x, str) else {})
+    tags_df = pd.json_normalize(exploded_tags)
+    return pd.concat([df.drop(columns=[tags_column]), tags_df], axis=1)
+
+def bench_tag_parsing(n_rows=1_000_000, repeats=1):
+    """Compare regex/json_normalize tag parsing with the single split pass, with and without a key filter."""
+    df = make_synthetic_tags(n_rows)
+
+    print(f"Tag parsing ({n_rows} rows, best of {repeats})")
+    for label, tags_to_keep in (("3 kept keys", ["network_type", "rcn_ref", "name"]), ("all keys", None)):
+        # both parsers must produce the same frame (same columns in the same order)
+        pd.testing.assert_frame_equal(_explode_tags_regex(df, "other_tags", tags_to_keep),
+                                      explode_tags(df, "other_tags", tags_to_keep))
+
+        t_regex = min(timeit.repeat(lambda: _explode_tags_regex(df, "other_tags", tags_to_keep),
+                                    setup="gc.enable()", number=1, repeat=repeats))
+        t_split = min(timeit.repeat(lambda: explode_tags(df, "other_tags", tags_to_keep),
+                                    setup="gc.enable()", number=1, repeat=repeats))
+        print(f"  {label}:")
+        print(f"    regex + json_normalize: {t_regex * 1000:8.1f} ms")
+        print(f"    single split pass:      {t_split * 1000:8.1f} ms  (x{t_regex / t_split:.1f})")
+
+BENCHMARKS = {
+    "gpx_parsing": bench_gpx_parsing,
+    "node_extraction": bench_node_extraction,
+    "match_engines": bench_match_engines,
+    "tooltips": bench_tooltips,
+    "osm_enrichment": bench_osm_enrichment,
+    "tag_parsing": bench_tag_parsing,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run pipeline micro-benchmarks.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
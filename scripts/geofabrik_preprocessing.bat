@@ -48,19 +48,10 @@ IF EXIST "data\raw\%FILENAME%" (
 )
 
 REM --- Filter OSM data for rcn network relations ---
+REM (segments and rcn_ref points are read from this file by scripts\geofabrik_processing.py)
 echo [INFO] Filtering OSM data for rcn network relations
 osmium tags-filter "data\raw\\%FILENAME%" r/network=rcn -o data\intermediate\rcn_relations.osm.pbf --overwrite
 echo [INFO] Extracted rcn relations
 
-echo [INFO] Filtering OSM data for rcn_ref points
-osmium tags-filter data\intermediate\rcn_relations.osm.pbf n/rcn_ref -o data\intermediate\rcn_ref_points.osm.pbf --overwrite
-echo [INFO] Extracted rcn_ref points
-
-REM --- Create output GeoPackage ---
-echo [INFO] Creating output GeoPackage: rcn_output.gpkg
-ogr2ogr -f "GPKG" data\intermediate\rcn_output.gpkg data\intermediate\rcn_relations.osm.pbf multilinestrings
-ogr2ogr -f "GPKG" -update data\intermediate\rcn_output.gpkg data\intermediate\rcn_ref_points.osm.pbf points
-echo [INFO] GeoPackage created: data\intermediate\rcn_output.gpkg
-
 echo [INFO] Processing complete.
 echo === END OSM PROCESSING ===
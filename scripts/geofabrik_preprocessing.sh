@@ -20,27 +20,12 @@ echo "[INFO] Using cached input file: $INPUT_FILE"
 echo "[INFO] Processing date: $DATE"
 
 # --- Filter OSM data ---
+# (segments and rcn_ref points are read from this file by scripts/geofabrik_processing.py)
 RCN_RELATIONS="$TEMP_DIR/rcn_relations.osm.pbf"
-RCN_POINTS="$TEMP_DIR/rcn_ref_points.osm.pbf"
 
 echo "[INFO] Filtering OSM relations (network=rcn)..."
-osmium tags-filter "$INPUT_FILE" r/network=rcn -o "$RCN_RELATIONS"
+osmium tags-filter "$INPUT_FILE" r/network=rcn -o "$RCN_RELATIONS" --overwrite
 echo "[INFO] Relations saved to: $RCN_RELATIONS"
 
-echo "[INFO] Filtering OSM points (rcn_ref)..."
-osmium tags-filter "$RCN_RELATIONS" n/rcn_ref -o "$RCN_POINTS"
-echo "[INFO] Points saved to: $RCN_POINTS"
-
-# --- Create GeoPackage ---
-OUTPUT_GPKG="$TEMP_DIR/rcn_output.gpkg"
-echo "[INFO] Creating GeoPackage: $OUTPUT_GPKG"
-ogr2ogr -f "GPKG" "$OUTPUT_GPKG" "$RCN_RELATIONS" multilinestrings
-echo "[INFO] Added multilinestrings layer to GeoPackage"
-
-ogr2ogr -f "GPKG" -update "$OUTPUT_GPKG" "$RCN_POINTS" points
-echo "[INFO] Added points layer to GeoPackage"
-
-echo "[INFO] GeoPackage created successfully: $OUTPUT_GPKG"
-
 echo "[INFO] Processing complete."
 echo "=== END OSM PROCESSING ==="
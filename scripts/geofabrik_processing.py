@@ -1,11 +1,20 @@
 import os
+import argparse
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import platform
+import pyogrio
+import shapely
 import subprocess
+import time
 from pathlib import Path
 from scripts.geofabrik_date import *
-from core.common import multiline_geojson, multiline_parquet_proj, point_parquet_proj
+from core.common import multiline_parquet_proj, point_parquet_proj
+from core.common import segment_simplify_levels, level_geometry_column, geometry_hash_column
+from app.utils import DATA_VERSION_FILE
 from tqdm import tqdm
 
 # geoprocessing
@@ -13,10 +22,40 @@ SCRIPTS_FOLDER = "scripts"
 buffer_distance = 20  # in meters
 simplify_tolerance = 10 #  in meters (will drastically decrease memory)
 intersect_threshold = 0.75
+network_tile_size = 20000  # in meters (tiles of the compared network forms, see --compare-network-forms)
 node_width = 3
-input_gpkg = "data/intermediate/rcn_output.gpkg"
+# OSM extract with the rcn relations (osmium output of the preprocessing script)
+input_osm = "data/intermediate/rcn_relations.osm.pbf"
+# attribute columns read from the OSM layers (all other tags are in 'other_tags')
+osm_columns = ["osm_id", "name", "other_tags"]
+# SQL filters of the OSM layers: segments with a "from-to" ref, nodes with a node number
+segment_where = """other_tags LIKE '%"ref"=>"%-%'"""
+point_where = """other_tags LIKE '%"rcn_ref"=>%'"""
+# summary of the changes found by an incremental refresh (see `enrich_incremental`)
+changeset_json = "data/processed/changeset.json"
+# segment columns added by `enrich_with_osm_ids` (reused for unchanged segments)
+enrich_columns = ['node_from', 'node_to', 'osm_id_from', 'osm_id_to', 'osm_match_flag']
 tqdm_default = {"mininterval": 0.1, "miniters": 1}
 
+def iter_tags(tag_string):
+    """
+    Yield the (key, value) pairs of a string-encoded dictionary of tags.
+
+    The string is split on the pair and key/value separators instead of being
+    matched with a regular expression. Colons in the keys are replaced with
+    underscores.
+
+    Args:
+        tag_string (str): String in the format '"key"=>"value","key"=>"value"'.
+
+    Yields:
+        tuple: (key, value) strings.
+    """
+    for pair in tag_string[1:-1].split('","'):
+        key, sep, value = pair.partition('"=>"')
+        if sep:
+            yield key.replace(':', '_'), value
+
 def parse_and_filter_tags(tag_string, tags_to_keep=None):
     """
     Parse a string-encoded dictionary of tags and optionally filter keys.
@@ -28,12 +67,7 @@ def parse_and_filter_tags(tag_string, tags_to_keep=None):
     Returns:
         dict: Parsed and optionally filtered dictionary of tags.
     """
-    # Regular expression to match key-value pairs in the format 'key'=>"value"
-    tag_pairs = re.findall(r'"(.*?)"=>"(.*?)"', tag_string)
-    tag_dict = dict(tag_pairs)
-
-    # Replace colons in the keys with underscores
-    tag_dict = {k.replace(':', '_'): v for k, v in tag_dict.items()}
+    tag_dict = dict(iter_tags(tag_string))
 
     # If tags_to_keep is None or empty, return all tags
     if tags_to_keep is None or len(tags_to_keep) == 0:
@@ -47,6 +81,10 @@ def explode_tags(df, tags_column, tags_to_keep=None):
     """
     Expand a column of string-encoded dictionaries in a GeoDataFrame into separate columns.
 
+    The tag strings are parsed in a single pass that fills one value array per
+    kept key, so no per-row dictionaries or intermediate wide frame are built.
+    Columns appear in order of first occurrence, with NaN where a row lacks the tag.
+
     Args:
         df (GeoDataFrame): Input GeoDataFrame containing a column with dictionary strings.
         tags_column (str): Name of the column to parse and expand.
@@ -55,13 +93,36 @@ def explode_tags(df, tags_column, tags_to_keep=None):
     Returns:
         GeoDataFrame: Original GeoDataFrame with the dictionary keys expanded as columns.
     """
-    # Convert the string representation of the dictionary to a Python dictionary
-    exploded_tags = df[tags_column].apply(lambda x: parse_and_filter_tags(x, tags_to_keep) if isinstance(x, str) else {})
-    
-    # Create a DataFrame from the exploded tags
-    tags_df = pd.json_normalize(exploded_tags)
-    
+    keep = set(tags_to_keep) if tags_to_keep else None
+    n_rows = len(df)
+
+    # Rows and values per tag key, collected in a single pass over the tag strings
+    tag_columns = {}
+    for row, tag_string in enumerate(df[tags_column].to_numpy()):
+        if not isinstance(tag_string, str):
+            continue
+        # same split as `iter_tags`, inlined for speed
+        for pair in tag_string[1:-1].split('","'):
+            key, sep, value = pair.partition('"=>"')
+            if not sep:
+                continue
+            key = key.replace(':', '_')
+            if keep is not None and key not in keep:
+                continue
+            rows_values = tag_columns.get(key)
+            if rows_values is None:
+                rows_values = tag_columns[key] = ([], [])
+            rows_values[0].append(row)
+            rows_values[1].append(value)
+
+    # Fill one value array per key (NaN where a row lacks the tag)
+    for key, (rows, values) in tag_columns.items():
+        column = np.full(n_rows, np.nan, dtype=object)
+        column[rows] = values
+        tag_columns[key] = column
+
     # Combine the original DataFrame with the new tags DataFrame
+    tags_df = pd.DataFrame(tag_columns, index=df.index)
     exploded_df = pd.concat([df.drop(columns=[tags_column]), tags_df], axis=1)
     
     return exploded_df
@@ -75,6 +136,10 @@ def enrich_with_osm_ids(
 ):
     """
     Enrich segment MultiLineStrings with osm_id_from and osm_id_to using buffer intersection.
+
+    All segment buffers are matched with the nodes in one spatial index query;
+    the candidate pairs are then filtered on node number and reduced to the
+    lowest osm_id per segment end without any per-segment loop.
     
     Args:
         gdf_multiline (GeoDataFrame): Line segments with 'ref' column formatted as "node_from-node_to".
@@ -108,50 +173,32 @@ def enrich_with_osm_ids(
     # Keep original rcn_ref, add a join column
     gdf_point['rcn_ref_join'] = gdf_point['rcn_ref'].astype(str).str.zfill(node_width)
 
-    # --- Step 1: loop over segments with buffer ---
-    osm_from_list = []
-    osm_to_list = []
-
-    iterator = tqdm(
-        gdf_multiline.iterrows(),
-        total=len(gdf_multiline),
-        desc="Matching segments",
-        **tqdm_params
+    # --- Step 1: bulk spatial join of segment buffers with nodes ---
+    # one index query returns every (segment, node) pair with the node inside the segment buffer
+    buffers = gdf_multiline.geometry.buffer(max_dist)
+    segment_idx, point_idx = gdf_point.sindex.query(buffers.values, predicate="intersects")
+    candidates = pd.DataFrame({
+        'segment': segment_idx,
+        'rcn_ref_join': gdf_point['rcn_ref_join'].to_numpy()[point_idx],
+        'osm_id': gdf_point['osm_id'].to_numpy()[point_idx]
+    })
+
+    # --- Step 2: lowest osm_id of the nodes with the segment's node number, per segment end ---
+    iterator = tqdm(["from", "to"], desc="Matching segment ends", **tqdm_params)
+    for end in iterator:
+        node_ref = gdf_multiline[f'node_{end}'].to_numpy()[candidates['segment'].to_numpy()]
+        matches = candidates[candidates['rcn_ref_join'].to_numpy() == node_ref]
+        osm_ids = matches.groupby('segment')['osm_id'].min().reindex(range(len(gdf_multiline)))
+        # None for segment ends without a node (as a list, so pandas infers the column type)
+        gdf_multiline[f'osm_id_{end}'] = osm_ids.astype(object).where(osm_ids.notna(), None).tolist()
+
+    # add match flag
+    has_from = gdf_multiline['osm_id_from'].notna()
+    has_to = gdf_multiline['osm_id_to'].notna()
+    gdf_multiline['osm_match_flag'] = np.select(
+        [has_from & has_to, ~has_from & ~has_to], ['full', 'none'], default='partial'
     )
 
-    for _, seg in iterator:
-        buffer_geom = seg.geometry.buffer(max_dist)
-
-        # Node FROM
-        candidates_from = gdf_point[gdf_point['rcn_ref_join'] == seg['node_from']]
-        candidates_from = candidates_from[candidates_from.intersects(buffer_geom)]
-        if not candidates_from.empty:
-            osm_from_list.append(candidates_from['osm_id'].min())
-        else:
-            osm_from_list.append(None)
-
-        # Node TO
-        candidates_to = gdf_point[gdf_point['rcn_ref_join'] == seg['node_to']]
-        candidates_to = candidates_to[candidates_to.intersects(buffer_geom)]
-        if not candidates_to.empty:
-            osm_to_list.append(candidates_to['osm_id'].min())
-        else:
-            osm_to_list.append(None)
-
-    gdf_multiline['osm_id_from'] = osm_from_list
-    gdf_multiline['osm_id_to'] = osm_to_list
-
-    # --- Step 2: add match flag ---
-    def match_flag(row):
-        if pd.notna(row['osm_id_from']) and pd.notna(row['osm_id_to']):
-            return 'full'
-        elif pd.isna(row['osm_id_from']) and pd.isna(row['osm_id_to']):
-            return 'none'
-        else:
-            return 'partial'
-
-    gdf_multiline['osm_match_flag'] = gdf_multiline.apply(match_flag, axis=1)
-
     # --- Step 3: summary and printout ---
     missing = gdf_multiline[gdf_multiline['osm_match_flag'] != 'full']
     num_segments = len(gdf_multiline)
@@ -167,10 +214,218 @@ def enrich_with_osm_ids(
 
     return gdf_multiline, gdf_point
 
-def process_osm_data(tqdm_params):
+def read_osm_layer(osm_file, layer, where=None, tags_to_keep=None):
+    """
+    Read a layer of an OSM extract straight into a projected GeoDataFrame with exploded tags.
+
+    The file is read with the GDAL OSM driver through pyogrio's Arrow path,
+    limited to `osm_columns` and filtered with `where` while reading, so no
+    intermediate GeoPackage is written.
+
+    Args:
+        osm_file (str): Path to the .osm.pbf file.
+        layer (str): OSM driver layer, e.g. 'multilinestrings' or 'points'.
+        where (str, optional): SQL WHERE clause applied while reading.
+        tags_to_keep (list, optional): Tags to explode into columns (see `explode_tags`).
+
+    Returns:
+        GeoDataFrame: Features in Belgian Lambert 2008 (EPSG:3812).
+    """
+    gdf = pyogrio.read_dataframe(osm_file, layer=layer, columns=osm_columns, where=where, use_arrow=True)
+    gdf = explode_tags(gdf, 'other_tags', tags_to_keep)
+    return gdf.to_crs(epsg=3812)
+
+def network_line_collections(geoms, tile_size=None):
+    """
+    Combine lines into multi-line features per square tile, without noding them.
+
+    Unlike a `union_all` dissolve, lines are not split at their intersections:
+    the parts of a tile are only joined where they share end points
+    (`shapely.line_merge`), which is much cheaper and looks the same on a map.
+
+    Args:
+        geoms (GeoSeries): Line geometries in a metric CRS.
+        tile_size (float, optional): Tile width in CRS units; lines go to the
+            tile of their bounding box center. None puts all lines in one feature.
+
+    Returns:
+        GeoDataFrame: One feature per non-empty tile, with 'tile_x' and 'tile_y'
+        tile indices, in the CRS of `geoms`.
+    """
+    parts = shapely.get_parts(np.asarray(geoms))
+    if tile_size:
+        bounds = shapely.bounds(parts)
+        tile_x = np.floor((bounds[:, 0] + bounds[:, 2]) / 2 / tile_size).astype(int)
+        tile_y = np.floor((bounds[:, 1] + bounds[:, 3]) / 2 / tile_size).astype(int)
+    else:
+        tile_x = tile_y = np.zeros(len(parts), dtype=int)
+
+    tiles, tile_index = np.unique(np.column_stack([tile_x, tile_y]), axis=0, return_inverse=True)
+    tile_index = tile_index.ravel()
+    order = np.argsort(tile_index, kind="stable")
+    groups = np.split(parts[order], np.cumsum(np.bincount(tile_index, minlength=len(tiles)))[:-1])
+    merged = [shapely.line_merge(shapely.multilinestrings(group)) for group in groups]
+    return gpd.GeoDataFrame({"tile_x": tiles[:, 0], "tile_y": tiles[:, 1]}, geometry=merged, crs=geoms.crs)
+
+def geometry_hashes(geoms):
+    """
+    Return a hash of every geometry, to detect changed geometries between data versions.
+
+    Args:
+        geoms (GeoSeries): Geometries.
+
+    Returns:
+        list: Hex digest of the WKB of every geometry.
+    """
+    return [hashlib.sha1(wkb).hexdigest() for wkb in shapely.to_wkb(np.asarray(geoms))]
+
+def diff_by_osm_id(gdf, gdf_previous, compare_columns):
+    """
+    Compare two versions of a layer by 'osm_id'.
+
+    Args:
+        gdf (GeoDataFrame): New version.
+        gdf_previous (GeoDataFrame): Previous version.
+        compare_columns (list): Columns that mark a feature as changed when they differ.
+
+    Returns:
+        tuple: (added, removed, changed) osm_id Index objects.
+    """
+    new = gdf.drop_duplicates('osm_id').set_index('osm_id')[compare_columns].fillna('')
+    previous = gdf_previous.drop_duplicates('osm_id').set_index('osm_id')[compare_columns].fillna('')
+    added = new.index.difference(previous.index)
+    removed = previous.index.difference(new.index)
+    common = new.index.intersection(previous.index)
+    changed = common[(new.loc[common] != previous.loc[common]).any(axis=1).to_numpy()]
+    return added, removed, changed
+
+def load_previous_outputs():
+    """
+    Read the segments and points of the previous data version, if usable for an incremental refresh.
+
+    Returns:
+        tuple or None: (segments, points) GeoDataFrames, or None if the files are
+        missing, unreadable (e.g. Git LFS pointers) or have no geometry hashes.
+    """
+    try:
+        gdf_multiline = gpd.read_parquet(multiline_parquet_proj)
+        gdf_point = gpd.read_parquet(point_parquet_proj)
+    except Exception as e:
+        print(f"[WARN] Previous outputs not readable ({e}), running a full refresh.")
+        return None
+    if geometry_hash_column not in gdf_multiline.columns or geometry_hash_column not in gdf_point.columns:
+        print("[WARN] Previous outputs have no geometry hashes, running a full refresh.")
+        return None
+    return gdf_multiline, gdf_point
+
+def enrich_incremental(
+    gdf_multiline: gpd.GeoDataFrame,
+    gdf_point: gpd.GeoDataFrame,
+    gdf_multiline_previous: gpd.GeoDataFrame,
+    gdf_point_previous: gpd.GeoDataFrame,
+    max_dist: float = 20.0,
+    node_width: int = 3,
+    tqdm_params: dict = tqdm_default
+):
+    """
+    Enrich only the segments that changed since the previous data version.
+
+    Segments and points are compared with the previous version by 'osm_id',
+    geometry hash and node number ('ref' / 'rcn_ref'). A segment is enriched
+    again (see `enrich_with_osm_ids`) if it is new or changed, or if a node that
+    was added, removed, moved or renumbered lies within `max_dist` of it; all
+    other segments keep their previous node ids.
+
+    Args:
+        gdf_multiline (GeoDataFrame): New segments with geometry hashes.
+        gdf_point (GeoDataFrame): New points with geometry hashes.
+        gdf_multiline_previous (GeoDataFrame): Enriched segments of the previous version.
+        gdf_point_previous (GeoDataFrame): Points of the previous version.
+        max_dist (float, optional): Buffer distance around segments to find candidate nodes (meters). Defaults to 20.0.
+        node_width (int, optional): Width for zero-padding node IDs. Defaults to 3.
+        tqdm_params (dict): progress bar parameters
+
+    Returns:
+        tuple:
+            gdf_multiline_enriched (GeoDataFrame): Segments with 'osm_id_from' and 'osm_id_to'.
+            gdf_point_with_join (GeoDataFrame): Points with added 'rcn_ref_join' for matching.
+            changeset (dict): Added, removed and changed osm_ids and counts per layer.
+    """
+    seg_added, seg_removed, seg_changed = diff_by_osm_id(
+        gdf_multiline, gdf_multiline_previous, [geometry_hash_column, 'ref'])
+    point_added, point_removed, point_changed = diff_by_osm_id(
+        gdf_point, gdf_point_previous, [geometry_hash_column, 'rcn_ref'])
+
+    # Old and new locations of nodes that appeared, disappeared, moved or got another number
+    node_geoms = np.concatenate([
+        gdf_point.geometry[gdf_point['osm_id'].isin(point_added.union(point_changed))].to_numpy(),
+        gdf_point_previous.geometry[gdf_point_previous['osm_id'].isin(point_removed.union(point_changed))].to_numpy()
+    ])
+    near_changed_nodes = np.zeros(len(gdf_multiline), dtype=bool)
+    if len(node_geoms):
+        segment_idx, _ = shapely.STRtree(node_geoms).query(
+            np.asarray(gdf_multiline.geometry), predicate="dwithin", distance=max_dist)
+        near_changed_nodes[segment_idx] = True
+
+    # Segments to enrich again (osm_ids that are not unique cannot be matched with the previous version)
+    duplicated = (gdf_multiline['osm_id'].duplicated(keep=False)
+                  | gdf_multiline['osm_id'].isin(gdf_multiline_previous['osm_id'][gdf_multiline_previous['osm_id'].duplicated()]))
+    changed_segments = gdf_multiline['osm_id'].isin(seg_added.union(seg_changed)).to_numpy()
+    redo = changed_segments | near_changed_nodes | duplicated.to_numpy()
+
+    # Unchanged segments keep their previous enrichment
+    reused = gdf_multiline[~redo].merge(
+        gdf_multiline_previous[['osm_id'] + enrich_columns], on='osm_id', how='left')
+
+    if redo.any():
+        print(f"[INFO] Enriching {redo.sum()} new or changed segments (reusing {len(reused)})...")
+        enriched, gdf_point = enrich_with_osm_ids(
+            gdf_multiline[redo], gdf_point, max_dist, node_width, tqdm_params)
+        # back to the original row order
+        order = np.argsort(np.concatenate([np.flatnonzero(~redo), np.flatnonzero(redo)]), kind="stable")
+        index = gdf_multiline.index
+        gdf_multiline = pd.concat([reused, enriched]).iloc[order]
+        gdf_multiline.index = index
+    else:
+        print(f"[INFO] No changed segments, reusing all {len(reused)} enriched segments.")
+        gdf_point = gdf_point.assign(rcn_ref_join=gdf_point['rcn_ref'].astype(str).str.zfill(node_width))
+        reused.index = gdf_multiline.index
+        gdf_multiline = reused
+
+    num_full_matches = (gdf_multiline['osm_match_flag'] == 'full').sum()
+    print(f"✅ Full matches (all segments): {num_full_matches}/{len(gdf_multiline)}")
+    print(f"[INFO] Segments: {len(seg_added)} added, {len(seg_removed)} removed, {len(seg_changed)} changed; "
+          f"points: {len(point_added)} added, {len(point_removed)} removed, {len(point_changed)} changed.")
+
+    changeset = {
+        "segments": {
+            "total": len(gdf_multiline),
+            "reenriched": int(redo.sum()),
+            "reused": int((~redo).sum()),
+            "near_changed_nodes": int((near_changed_nodes & ~changed_segments).sum()),
+            "added": [str(i) for i in seg_added],
+            "removed": [str(i) for i in seg_removed],
+            "changed": [str(i) for i in seg_changed]
+        },
+        "points": {
+            "total": len(gdf_point),
+            "added": [str(i) for i in point_added],
+            "removed": [str(i) for i in point_removed],
+            "changed": [str(i) for i in point_changed]
+        }
+    }
+    return gdf_multiline, gdf_point, changeset
+
+def process_osm_data(tqdm_params, incremental=False, compare_network_forms=False):
     """
     Download Belgium OSM data, process segments and points, 
-    enrich segments with OSM node IDs, and save GeoJSON outputs.
+    enrich segments with OSM node IDs, and save parquet outputs.
+
+    With `incremental`, only segments that changed since the previous outputs
+    are enriched (see `enrich_incremental`) and a changeset summary is written
+    to `changeset_json`. With `compare_network_forms`, the build time and GeoJSON
+    size of the network as plain and tiled line collections are reported
+    (see `network_line_collections`).
     """
     current_os = platform.system()
     print(f"[INFO] Running on {current_os}")
@@ -178,7 +433,7 @@ def process_osm_data(tqdm_params):
     osm_version = get_latest_geofabrik_date()
     print(f"[INFO] Latest Geofabrik OSM version: {osm_version}")
 
-    # Download Belgium OSM, extract rcn data, create GeoPackage and keep key files
+    # Download Belgium OSM and extract the rcn relations
     if current_os == "Windows":
         # Get absolute path to batch script to avoid relative path issues on Windows
         script_path = Path(os.path.join(SCRIPTS_FOLDER, "geofabrik_preprocessing.bat")).resolve()
@@ -190,62 +445,85 @@ def process_osm_data(tqdm_params):
             shell=True  # needed on Windows to run a .bat file
         )
 
-    # Read from geopackage
-    print(f"[INFO] Reading GeoPackage: {input_gpkg}")
-    gdf_multiline = gpd.read_file(input_gpkg, layer=0)
-    gdf_point = gpd.read_file(input_gpkg, layer=1)
-    print(f"[INFO] Loaded {len(gdf_multiline)} multilines and {len(gdf_point)} points.")
-
-    # List of tags you want to keep
-    print("[INFO] Exploding multiline tags...")
+    # Read the OSM layers, explode the tags and convert to Belgian Lambert 2008
+    print(f"[INFO] Reading OSM extract: {input_osm}")
     tags_to_keep = ["network_type", "ref", "route"]
-    tags_column = 'other_tags'
-    gdf_multiline = explode_tags(gdf_multiline, tags_column, tags_to_keep)
-    before_filter = len(gdf_multiline)
-    gdf_multiline = gdf_multiline[gdf_multiline['ref'].fillna('').str.contains('-', na=False)]
-    print(f"[INFO] Filtered multilines from {before_filter} → {len(gdf_multiline)} valid segments.")
-
-    # Process the points tags
-    print("[INFO] Exploding point tags...")
-    gdf_point = explode_tags(gdf_point, tags_column)
-    print(f"[INFO] Points dataframe after tag processing: {len(gdf_point)} features.")
-
-    # Convert to Belgian Lambert 2008
-    print("[INFO] Projecting to Belgian Lambert 2008 (EPSG:3812)...")
-    gdf_multiline_projected = gdf_multiline.to_crs(epsg=3812)
-    gdf_point_projected = gdf_point.to_crs(epsg=3812)
+    gdf_multiline_projected = read_osm_layer(input_osm, "multilinestrings", segment_where, tags_to_keep)
+    gdf_point_projected = read_osm_layer(input_osm, "points", point_where)
+    print(f"[INFO] Loaded {len(gdf_multiline_projected)} multilines and {len(gdf_point_projected)} points (EPSG:3812).")
+
+    # the SQL filter matches "ref" anywhere in the tags, check the exploded column as well
+    before_filter = len(gdf_multiline_projected)
+    gdf_multiline_projected = gdf_multiline_projected[
+        gdf_multiline_projected['ref'].fillna('').str.contains('-', na=False)
+    ].copy()
+    print(f"[INFO] Filtered multilines from {before_filter} → {len(gdf_multiline_projected)} valid segments.")
+
+    # Hash the geometries (compared by the next incremental refresh)
+    gdf_multiline_projected[geometry_hash_column] = geometry_hashes(gdf_multiline_projected.geometry)
+    gdf_point_projected[geometry_hash_column] = geometry_hashes(gdf_point_projected.geometry)
 
     # Look up matching node osm_id for segment nodes
-    print("[INFO] Enriching multilines with OSM node IDs...")
-    gdf_multiline_projected, gdf_point_projected = \
-        enrich_with_osm_ids(gdf_multiline_projected, gdf_point_projected, 
-                            buffer_distance, node_width, tqdm_params)
+    previous = load_previous_outputs() if incremental else None
+    if previous is not None:
+        print("[INFO] Enriching changed multilines with OSM node IDs...")
+        gdf_multiline_projected, gdf_point_projected, changeset = \
+            enrich_incremental(gdf_multiline_projected, gdf_point_projected, *previous,
+                               buffer_distance, node_width, tqdm_params)
+    else:
+        print("[INFO] Enriching multilines with OSM node IDs...")
+        gdf_multiline_projected, gdf_point_projected = \
+            enrich_with_osm_ids(gdf_multiline_projected, gdf_point_projected, 
+                                buffer_distance, node_width, tqdm_params)
+        changeset = {"segments": {"total": len(gdf_multiline_projected)},
+                     "points": {"total": len(gdf_point_projected)}}
     print("[INFO] Enrichment completed.")
 
+    if incremental:
+        previous_version = DATA_VERSION_FILE.read_text().strip() if DATA_VERSION_FILE.exists() else None
+        changeset = {"osm_version": osm_version, "previous_version": previous_version,
+                     "mode": "incremental" if previous is not None else "full", **changeset}
+        with open(changeset_json, "w") as f:
+            json.dump(changeset, f, indent=2)
+        print(f"[INFO] Changeset ({changeset['mode']}) written to {changeset_json}.")
+
     # Simplify geometry (with tolerance in m) & add segment length
     # Note: only keeping relevant attribute columns doesn't make much difference
     gdf_multiline_projected['geometry'] = gdf_multiline_projected['geometry'].simplify(tolerance=simplify_tolerance, preserve_topology=True)
     gdf_multiline_projected["length_km"] = gdf_multiline_projected.geometry.length / 1000.0
 
-    # Convert the enriched result back to WGS84
-    print("[INFO] Converting back to WGS84 (EPSG:4326)...")
-    gdf_multiline = gdf_multiline_projected.to_crs(epsg=4326)
-    gdf_point = gdf_point_projected.to_crs(epsg=4326)
-
-    # Dissolve all geometries in a GeoDataFrame into one combined geometry
-    merged = gdf_multiline.geometry.union_all()
-    gdf_multiline = gpd.GeoDataFrame(geometry=[merged], crs=gdf_multiline.crs)
-
-    # Save the outputs as GeoJSON and parquet for use in the app
-    # compared to shapefiles there is no truncation of column names but takes longer
+    # Add coarser geometries for the map at lower zoom levels (extra geometry columns)
+    for _, tolerance in segment_simplify_levels:
+        gdf_multiline_projected[level_geometry_column(tolerance)] = \
+            gdf_multiline_projected.geometry.simplify(tolerance=tolerance, preserve_topology=True)
+
+    # Compare the cost and size of the network as plain and tiled line collections
+    # (a cheap alternative to a union_all dissolve, which nodes the whole network)
+    if compare_network_forms:
+        print("[INFO] Comparing the network line collection forms...")
+        for form, tile_size in [("plain", None), ("tiled", network_tile_size)]:
+            start = time.perf_counter()
+            gdf_network = network_line_collections(gdf_multiline_projected.geometry, tile_size).to_crs(epsg=4326)
+            elapsed = time.perf_counter() - start
+            size_mb = len(gdf_network.to_json().encode()) / 1024**2
+            print(f"[INFO] Network as {form} line collection: {len(gdf_network)} feature(s), "
+                  f"{elapsed:.2f} s, {size_mb:.2f} MB as GeoJSON")
+
+    # Save the outputs as parquet for use in the app
+    # (the map network layers are built from the projected segments, see app/network_layer.py)
     print("[INFO] Saving outputs...")
-    # main outputs
-    gdf_multiline.to_file(multiline_geojson, driver='GeoJSON')
     gdf_multiline_projected.to_parquet(multiline_parquet_proj, engine="pyarrow")
     gdf_point_projected.to_parquet(point_parquet_proj, engine="pyarrow")
     print("[INFO] All outputs saved successfully.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process the Geofabrik extract into the network files of the app.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only enrich segments that changed since the previous outputs and write a changeset summary")
+    parser.add_argument("--compare-network-forms", action="store_true",
+                        help="report build time and GeoJSON size of the network as plain and tiled line collections")
+    args = parser.parse_args()
+
     current_os = platform.system()
     if current_os == "Windows":
         # Local usage (more frequent updates)
@@ -253,5 +531,5 @@ if __name__ == "__main__":
     else:
         # GitHub Actions / CI (less frequent updates)
         tqdm_params = dict(mininterval=3.0, miniters=50) 
-    process_osm_data(tqdm_params)
+    process_osm_data(tqdm_params, args.incremental, args.compare_network_forms)
     
\ No newline at end of file